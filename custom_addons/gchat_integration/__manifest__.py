@@ -1,6 +1,6 @@
 {
     'name': 'Google Chat Integration',
-    'version': '16.0.1.0.0',
+    'version': '16.0.1.1.0',
     'category': 'Project',
     'summary': 'Integrate Odoo Projects with Google Chat Spaces',
     'description': """
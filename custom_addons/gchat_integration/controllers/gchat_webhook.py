@@ -4,16 +4,245 @@ from odoo.http import request
 import json
 import base64
 import logging
+import time
 import urllib.parse
-import requests
+from markupsafe import escape
 from werkzeug.exceptions import Unauthorized, BadRequest
-from odoo import fields
-from datetime import timedelta
+from werkzeug.wrappers import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 _logger = logging.getLogger(__name__)
 
+_BEARER_PREFIX = 'Bearer '
+_BEARER_PREFIX_LEN = len(_BEARER_PREFIX)
+
+# Event log statuses meaning a redelivered event needs no further work
+_PROCESSED_STATUSES = ('done', 'processing')
+
+# Seconds a health check result is reused, to absorb load balancer probes
+HEALTH_CACHE_TTL = 5
+_health_cache = {}
+
+
+# Static OAuth callback pages, encoded once at import time
+_OAUTH_HTML_SUCCESS = """
+<html>
+<body>
+    <h2>Xác thực thành công!</h2>
+    <p>Đã lưu token Google Chat thành công.</p>
+    <p>Bây giờ bạn có thể:</p>
+    <ul>
+        <li>Gửi DM với cardsV2</li>
+        <li>Tạo và quản lý spaces</li>
+        <li>Gửi thông báo khi task thay đổi stage</li>
+    </ul>
+    <p><a href="/web">Quay lại Odoo</a></p>
+</body>
+</html>
+""".encode('utf-8')
+
+_OAUTH_HTML_NO_CODE = """
+<html>
+<body>
+    <h2>Lỗi xác thực</h2>
+    <p>Không nhận được mã xác thực từ Google.</p>
+    <p><a href="/web">Quay lại Odoo</a></p>
+</body>
+</html>
+""".encode('utf-8')
+
+_OAUTH_HTML_NO_CONFIG = """
+<html>
+<body>
+    <h2>Lỗi cấu hình</h2>
+    <p>Không tìm thấy cấu hình Google Chat.</p>
+    <p><a href="/web">Quay lại Odoo</a></p>
+</body>
+</html>
+""".encode('utf-8')
+
+# Error page template; values must be HTML-escaped before formatting
+_OAUTH_HTML_ERROR = """
+<html>
+<body>
+    <h2>{title}</h2>
+    <p>Lỗi: {error}</p>
+    <p><a href="/web">Quay lại Odoo</a></p>
+</body>
+</html>
+"""
+
+
+def _html_response(html):
+    """Wrap an HTML page (str or bytes) in a plain werkzeug response."""
+    return Response(html, mimetype='text/html')
+
+
+def _bytes_response(body, status=200, mimetype='text/plain'):
+    """Return a pre-encoded body as a plain werkzeug response with its length."""
+    return Response(body, status=status, mimetype=mimetype,
+                    headers={'Content-Length': str(len(body))})
+
+
+def _loads(data):
+    """Decode JSON bytes, with orjson when available."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 class GchatWebhookController(http.Controller):
+
+    def _authenticate_webhook(self):
+        """
+        Verify the webhook bearer token.
+        
+        Returns:
+            gchat.config: Configuration owning the token
+        """
+        auth_header = request.httprequest.headers.get('Authorization') or ''
+        if auth_header[:_BEARER_PREFIX_LEN] != _BEARER_PREFIX:
+            _logger.error("Missing or invalid Authorization header")
+            raise Unauthorized("Missing or invalid Authorization header")
+        
+        token = auth_header[_BEARER_PREFIX_LEN:].strip()
+        
+        # Find configuration with matching webhook token
+        config = request.env['gchat.config'].sudo()._resolve_webhook_token(token)
+        
+        if not config:
+            _logger.error("Invalid webhook token: %s", token)
+            raise Unauthorized("Invalid webhook token")
+        
+        return config
+
+    def _decode_event(self, data):
+        """
+        Validate a webhook event and decode its payload.
+        
+        Args:
+            data (dict): Event in the webhook payload format
+            
+        Returns:
+            tuple: (envelope, event log values, raw event bytes)
+        """
+        message_id = data.get('message_id')
+        data_base64 = data.get('data_base64')
+        
+        if not message_id or not data_base64:
+            _logger.error("Missing required fields: message_id or data_base64")
+            raise BadRequest("Missing required fields")
+        
+        try:
+            raw_event = base64.b64decode(data_base64)
+        except Exception as e:
+            _logger.error("Failed to decode event data: %s", e)
+            raise BadRequest("Invalid event data format")
+        
+        return self._build_event(message_id, data.get('publish_time'), data.get('attributes', {}), raw_event)
+
+    def _build_event(self, message_id, publish_time, attributes, raw_event):
+        """
+        Build the envelope and event log values for raw event bytes.
+        
+        Args:
+            message_id (str): Pub/Sub message id
+            publish_time (str): Pub/Sub publish time
+            attributes (dict): Pub/Sub message attributes
+            raw_event (bytes): Event JSON as received
+            
+        Returns:
+            tuple: (envelope, event log values, decoded event dict)
+        """
+        # Parsed once here: the dict is handed to process_incoming, while the
+        # raw text goes to the jsonb column and is parsed by PostgreSQL
+        try:
+            payload_json = raw_event.decode('utf-8')
+            event_json = _loads(raw_event)
+            if not isinstance(event_json, dict):
+                raise ValueError("event payload is not a JSON object")
+            event_type = event_json.get('eventType', 'UNKNOWN')
+        except Exception as e:
+            _logger.error("Failed to decode event data: %s", e)
+            raise BadRequest("Invalid event data format")
+        
+        envelope = {
+            'message_id': message_id,
+            'publish_time': publish_time,
+            'attributes': attributes
+        }
+        vals = {
+            'external_event_id': message_id,
+            'source': 'chat',
+            'event_type': event_type,
+            'payload_json': payload_json,
+            'status': 'new'
+        }
+        return envelope, vals, event_json
+
+    def _get_logged_events(self, message_ids):
+        """
+        Look up chat events that were already logged.
+        
+        Args:
+            message_ids (list): Pub/Sub message ids
+            
+        Returns:
+            dict: {message_id: (event log id, status)}
+        """
+        if not message_ids:
+            return {}
+        
+        request.env.cr.execute("""
+            SELECT external_event_id, id, status
+              FROM gchat_event_log
+             WHERE external_event_id IN %s AND source = 'chat'
+        """, (tuple(message_ids),))
+        return {row[0]: (row[1], row[2]) for row in request.env.cr.fetchall()}
+
+    def _ingest_event(self, message_id, load_event):
+        """
+        Log and process a single webhook event.
+        
+        Args:
+            message_id (str): Pub/Sub message id
+            load_event (callable): Returns (envelope, event log values, decoded
+                event); only called when the event needs processing
+            
+        Returns:
+            bool: True if processed successfully
+        """
+        # Pub/Sub redeliveries of handled events skip decoding entirely
+        logged = self._get_logged_events([message_id]) if message_id else {}
+        if message_id in logged and logged[message_id][1] in _PROCESSED_STATUSES:
+            _logger.info("Event %s already processed, skipping", message_id)
+            return True
+        
+        envelope, vals, event_json = load_event()
+        
+        # Create event log record, or retry the one left by an earlier delivery
+        EventLog = request.env['gchat.event.log'].sudo()
+        if message_id in logged:
+            event_log = EventLog.browse(logged[message_id][0])
+        else:
+            event_log = EventLog.ingest([vals])
+            if not event_log:
+                # A concurrent delivery logged it first and owns the processing
+                _logger.info("Event %s already logged by another delivery, skipping", message_id)
+                return True
+        
+        # Process the event
+        success = event_log.process_incoming(envelope, event_json)
+        
+        if success:
+            _logger.info("Successfully processed event %s", envelope['message_id'])
+        else:
+            _logger.error("Failed to process event %s", envelope['message_id'])
+        return success
     
     @http.route('/gchat/webhook', auth='none', type='json', csrf=False, methods=['POST'])
     def gchat_webhook(self, **kwargs):
@@ -38,75 +267,164 @@ class GchatWebhookController(http.Controller):
                 _logger.error("No JSON data received in webhook")
                 raise BadRequest("No JSON data received")
             
-            # Verify webhook token
-            auth_header = request.httprequest.headers.get('Authorization')
-            if not auth_header or not auth_header.startswith('Bearer '):
-                _logger.error("Missing or invalid Authorization header")
-                raise Unauthorized("Missing or invalid Authorization header")
+            self._authenticate_webhook()
             
-            token = auth_header.split(' ')[1]
+            success = self._ingest_event(data.get('message_id'), lambda: self._decode_event(data))
+            return "OK" if success else "ERROR"
+                
+        except Unauthorized:
+            _logger.error("Unauthorized webhook request")
+            return "UNAUTHORIZED", 401
+        except BadRequest as e:
+            _logger.error("Bad request in webhook: %s", e)
+            return "BAD_REQUEST", 400
+        except Exception as e:
+            _logger.error("Unexpected error in webhook: %s", e)
+            return "INTERNAL_ERROR", 500
+
+    @http.route('/gchat/webhook/binary', auth='none', type='http', csrf=False, methods=['POST'])
+    def gchat_webhook_binary(self, **kwargs):
+        """
+        Webhook endpoint for a single Google Chat event in binary content mode.
+        
+        The request body is the raw event JSON and the Pub/Sub metadata is
+        sent in the X-Gchat-Message-Id, X-Gchat-Publish-Time and
+        X-Gchat-Attributes (JSON object) headers, so the event needs no
+        base64 encoding.
+        
+        Returns:
+            Response: "OK" on success
+        """
+        try:
+            self._authenticate_webhook()
             
-            # Find configuration with matching webhook token
-            config = request.env['gchat.config'].sudo().search([
-                ('webhook_token', '=', token),
-                ('is_active', '=', True)
-            ], limit=1)
+            headers = request.httprequest.headers
+            message_id = headers.get('X-Gchat-Message-Id')
+            raw_event = request.httprequest.get_data()
+            if not message_id or not raw_event:
+                _logger.error("Missing required fields: message id header or body")
+                raise BadRequest("Missing required fields")
             
-            if not config:
-                _logger.error(f"Invalid webhook token: {token}")
-                raise Unauthorized("Invalid webhook token")
+            try:
+                attributes = json.loads(headers.get('X-Gchat-Attributes') or '{}')
+            except ValueError:
+                raise BadRequest("Invalid attributes header")
             
-            # Extract event data
-            message_id = data.get('message_id')
-            publish_time = data.get('publish_time')
-            attributes = data.get('attributes', {})
-            data_base64 = data.get('data_base64')
+            success = self._ingest_event(message_id, lambda: self._build_event(
+                message_id, headers.get('X-Gchat-Publish-Time'), attributes, raw_event
+            ))
+            return _bytes_response(b"OK" if success else b"ERROR")
             
-            if not message_id or not data_base64:
-                _logger.error("Missing required fields: message_id or data_base64")
-                raise BadRequest("Missing required fields")
+        except Unauthorized:
+            _logger.error("Unauthorized binary webhook request")
+            return _bytes_response(b"UNAUTHORIZED", status=401)
+        except BadRequest as e:
+            _logger.error("Bad request in binary webhook: %s", e)
+            return _bytes_response(b"BAD_REQUEST", status=400)
+        except Exception as e:
+            _logger.error("Unexpected error in binary webhook: %s", e)
+            return _bytes_response(b"INTERNAL_ERROR", status=500)
+
+    @http.route('/gchat/webhook/batch', auth='none', type='json', csrf=False, methods=['POST'])
+    def gchat_webhook_batch(self, **kwargs):
+        """
+        Batched webhook endpoint for Google Chat events.
+        
+        Expected payload format:
+        {
+            "events": [
+                {"message_id": ..., "publish_time": ..., "attributes": {...}, "data_base64": ...},
+                ...
+            ]
+        }
+        
+        Returns:
+            dict: {"results": [{"message_id": ..., "status": "OK"}, ...]} where
+                status is one of OK, ERROR or BAD_REQUEST
+        """
+        try:
+            data = request.jsonrequest
+            events = data.get('events') if isinstance(data, dict) else None
+            if not isinstance(events, list):
+                _logger.error("No events list received in batch webhook")
+                raise BadRequest("No events list received")
             
-            # Decode base64 data
-            try:
-                event_data = base64.b64decode(data_base64).decode('utf-8')
-                event_json = json.loads(event_data)
-            except Exception as e:
-                _logger.error(f"Failed to decode event data: {str(e)}")
-                raise BadRequest("Invalid event data format")
-            
-            # Create event log record
-            event_log = request.env['gchat.event.log'].sudo().create({
-                'external_event_id': message_id,
-                'source': 'chat',
-                'event_type': event_json.get('eventType', 'UNKNOWN'),
-                'payload_json': json.dumps(event_json, indent=2),
-                'status': 'new'
-            })
-            
-            # Process the event
-            envelope = {
-                'message_id': message_id,
-                'publish_time': publish_time,
-                'attributes': attributes
+            self._authenticate_webhook()
+            
+            # Pub/Sub redeliveries of handled events skip decoding entirely
+            logged = self._get_logged_events([
+                event['message_id'] for event in events
+                if isinstance(event, dict) and isinstance(event.get('message_id'), str)
+            ])
+            
+            # Decode every event first so the logs can be inserted in one batch
+            results = []
+            decoded = []
+            first_results = {}
+            duplicates = []
+            for event in events:
+                message_id = event.get('message_id') if isinstance(event, dict) else None
+                result = {'message_id': message_id, 'status': 'ERROR'}
+                results.append(result)
+                # A message repeated within the batch is handled once; later
+                # copies report the first copy's result
+                if isinstance(message_id, str):
+                    if message_id in first_results:
+                        duplicates.append((result, first_results[message_id]))
+                        continue
+                    first_results[message_id] = result
+                if message_id in logged and logged[message_id][1] in _PROCESSED_STATUSES:
+                    result['status'] = 'OK'
+                    continue
+                try:
+                    decoded.append((result, *self._decode_event(event)))
+                except BadRequest:
+                    result['status'] = 'BAD_REQUEST'
+                except Exception as e:
+                    _logger.error("Failed to decode event %s: %s", message_id, e)
+            
+            # Redelivered events reuse their existing log; events logged
+            # concurrently by another delivery are skipped by the upsert
+            EventLog = request.env['gchat.event.log'].sudo()
+            logs_by_id = {
+                message_id: EventLog.browse(log_id)
+                for message_id, (log_id, _status) in logged.items()
             }
+            new_vals = {}
+            for _result, envelope, vals, _event in decoded:
+                if envelope['message_id'] not in logs_by_id:
+                    new_vals.setdefault(envelope['message_id'], vals)
+            for log in EventLog.ingest(list(new_vals.values())):
+                logs_by_id[log.external_event_id] = log
             
-            success = event_log.process_incoming(envelope, event_json)
+            owned = []
+            for entry in decoded:
+                if entry[1]['message_id'] in logs_by_id:
+                    owned.append(entry)
+                else:
+                    # Logged by a concurrent delivery, which owns the processing
+                    entry[0]['status'] = 'OK'
+            
+            # Authors, threads and chatter messages are handled once for the whole batch
+            successes = EventLog.process_incoming_batch([
+                (logs_by_id[envelope['message_id']], envelope, event_json)
+                for _result, envelope, _vals, event_json in owned
+            ])
+            for (result, *_rest), success in zip(owned, successes):
+                result['status'] = 'OK' if success else 'ERROR'
+            for result, first_result in duplicates:
+                result['status'] = first_result['status']
+            
+            return {'results': results}
             
-            if success:
-                _logger.info(f"Successfully processed event {message_id}")
-                return "OK"
-            else:
-                _logger.error(f"Failed to process event {message_id}")
-                return "ERROR"
-                
         except Unauthorized:
-            _logger.error("Unauthorized webhook request")
+            _logger.error("Unauthorized batch webhook request")
             return "UNAUTHORIZED", 401
         except BadRequest as e:
-            _logger.error(f"Bad request in webhook: {str(e)}")
+            _logger.error("Bad request in batch webhook: %s", e)
             return "BAD_REQUEST", 400
         except Exception as e:
-            _logger.error(f"Unexpected error in webhook: {str(e)}")
+            _logger.error("Unexpected error in batch webhook: %s", e)
             return "INTERNAL_ERROR", 500
 
     @http.route('/gchat/oauth/callback', auth='public', type='http', methods=['GET'])
@@ -120,26 +438,13 @@ class GchatWebhookController(http.Controller):
             error = kwargs.get('error')
             
             if error:
-                return f"""
-                <html>
-                <body>
-                    <h2>Lỗi xác thực Google</h2>
-                    <p>Lỗi: {error}</p>
-                    <p><a href="/web">Quay lại Odoo</a></p>
-                </body>
-                </html>
-                """
+                return _html_response(_OAUTH_HTML_ERROR.format_map({
+                    'title': 'Lỗi xác thực Google',
+                    'error': escape(error),
+                }))
             
             if not code:
-                return """
-                <html>
-                <body>
-                    <h2>Lỗi xác thực</h2>
-                    <p>Không nhận được mã xác thực từ Google.</p>
-                    <p><a href="/web">Quay lại Odoo</a></p>
-                </body>
-                </html>
-                """
+                return _html_response(_OAUTH_HTML_NO_CODE)
             
             # Tìm config để lưu token
             config = request.env['gchat.config'].sudo().search([
@@ -147,77 +452,31 @@ class GchatWebhookController(http.Controller):
             ], limit=1)
             
             if not config:
-                return """
-                <html>
-                <body>
-                    <h2>Lỗi cấu hình</h2>
-                    <p>Không tìm thấy cấu hình Google Chat.</p>
-                    <p><a href="/web">Quay lại Odoo</a></p>
-                </body>
-                </html>
-                """
-            
-            # Lấy redirect URI
-            base_url = request.env['ir.config_parameter'].sudo().get_param('web.base.url')
-            redirect_uri = base_url.rstrip('/') + '/gchat/oauth/callback'
+                return _html_response(_OAUTH_HTML_NO_CONFIG)
             
-            # Đổi code lấy token
-            token_data = {
-                'code': code,
-                'client_id': config.oauth_client_id,
-                'client_secret': config.oauth_client_secret,
-                'redirect_uri': redirect_uri,
-                'grant_type': 'authorization_code'
-            }
+            # Lấy redirect URI (must match the one sent by action_get_oauth_token)
+            redirect_uri = config._oauth_redirect_uri()
             
-            token_response = requests.post('https://oauth2.googleapis.com/token', data=token_data)
-            token_info = token_response.json()
+            # Đổi code lấy token
+            token_info = config._exchange_oauth_code(code, redirect_uri)
             
             if 'error' in token_info:
-                return f"""
-                <html>
-                <body>
-                    <h2>Lỗi lấy token</h2>
-                    <p>Lỗi: {token_info.get('error_description', token_info.get('error'))}</p>
-                    <p><a href="/web">Quay lại Odoo</a></p>
-                </body>
-                </html>
-                """
+                return _html_response(_OAUTH_HTML_ERROR.format_map({
+                    'title': 'Lỗi lấy token',
+                    'error': escape(token_info.get('error_description', token_info.get('error'))),
+                }))
             
             # Lưu token vào config
-            config.write({
-                'access_token': token_info.get('access_token'),
-                'refresh_token': token_info.get('refresh_token'),
-                'token_expiry': fields.Datetime.now() + timedelta(seconds=token_info.get('expires_in', 3600))
-            })
-            
-            return """
-            <html>
-            <body>
-                <h2>Xác thực thành công!</h2>
-                <p>Đã lưu token Google Chat thành công.</p>
-                <p>Bây giờ bạn có thể:</p>
-                <ul>
-                    <li>Gửi DM với cardsV2</li>
-                    <li>Tạo và quản lý spaces</li>
-                    <li>Gửi thông báo khi task thay đổi stage</li>
-                </ul>
-                <p><a href="/web">Quay lại Odoo</a></p>
-            </body>
-            </html>
-            """
+            config._store_oauth_tokens(token_info)
+            
+            return _html_response(_OAUTH_HTML_SUCCESS)
             
         except Exception as e:
-            _logger.error(f"OAuth callback error: {str(e)}")
-            return f"""
-            <html>
-            <body>
-                <h2>Lỗi xử lý</h2>
-                <p>Lỗi: {str(e)}</p>
-                <p><a href="/web">Quay lại Odoo</a></p>
-            </body>
-            </html>
-            """
+            _logger.error("OAuth callback error: %s", e)
+            return _html_response(_OAUTH_HTML_ERROR.format_map({
+                'title': 'Lỗi xử lý',
+                'error': escape(str(e)),
+            }))
 
     @http.route('/gchat/webhook/health', auth='none', type='http', methods=['GET'])
     def webhook_health(self, **kwargs):
@@ -225,23 +484,38 @@ class GchatWebhookController(http.Controller):
         Health check endpoint for webhook.
         
         Returns:
-            str: Health status
+            Response: JSON health status
         """
         try:
-            # Check if any active configuration exists
-            config_count = request.env['gchat.config'].sudo().search_count([
-                ('is_active', '=', True)
-            ])
+            dbname = request.env.cr.dbname
+            now = time.monotonic()
+            cached = _health_cache.get(dbname)
+            if cached and cached[0] > now:
+                return _bytes_response(cached[2], mimetype='application/json')
+            
+            # Count active configurations and read latest event time in one query
+            request.env.cr.execute("""
+                SELECT (SELECT COUNT(*) FROM gchat_config WHERE is_active),
+                       (SELECT MAX(create_date) FROM gchat_event_log)
+            """)
+            state = request.env.cr.fetchone()
             
-            return json.dumps({
-                'status': 'healthy',
-                'active_configs': config_count,
-                'timestamp': request.env['gchat.event.log'].sudo().search([], order='create_date desc', limit=1).create_date.isoformat() if request.env['gchat.event.log'].sudo().search_count([]) > 0 else None
-            })
+            # Only re-serialize when the reported values changed
+            if cached and cached[1] == state:
+                body = cached[2]
+            else:
+                config_count, last_event = state
+                body = json.dumps({
+                    'status': 'healthy',
+                    'active_configs': config_count,
+                    'timestamp': last_event.isoformat() if last_event else None
+                }).encode()
+            _health_cache[dbname] = (now + HEALTH_CACHE_TTL, state, body)
+            return _bytes_response(body, mimetype='application/json')
             
         except Exception as e:
-            _logger.error(f"Health check failed: {str(e)}")
-            return json.dumps({
+            _logger.error("Health check failed: %s", e)
+            return _bytes_response(json.dumps({
                 'status': 'unhealthy',
                 'error': str(e)
-            }), 500 
\ No newline at end of file
+            }).encode(), status=500, mimetype='application/json') 
\ No newline at end of file
@@ -6,7 +6,9 @@ This script pulls messages from Google Cloud Pub/Sub and forwards them to Odoo w
 """
 
 import argparse
+import asyncio
 import base64
+import io
 import json
 import logging
 import sys
@@ -14,7 +16,15 @@ import time
 from datetime import datetime
 from typing import Dict, Any
 
-import requests
+import httpx
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
 from google.cloud import pubsub_v1
 from google.oauth2 import service_account
 
@@ -25,21 +35,47 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Payloads larger than this are stream-parsed instead of fully materialized
+STREAM_PARSE_THRESHOLD = 256 * 1024
+
+# Batch webhook statuses that end delivery; ERROR or no result is retried
+ACKED_STATUSES = ('OK', 'BAD_REQUEST')
+
+
+def _dumps(obj) -> bytes:
+    """Serialize a request body to JSON bytes, using orjson when available."""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def _loads(data):
+    """Parse JSON bytes, using orjson when available."""
+    if orjson:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 class GchatListener:
-    """Google Chat Pub/Sub listener for Odoo integration."""
+    """Google Chat Pub/Sub listener for Odoo integration.
+    
+    Pub/Sub callbacks hand messages to an asyncio queue; worker coroutines
+    deliver them to Odoo so in-flight requests do not each hold a thread.
+    """
     
     def __init__(self, config: Dict[str, Any]):
         """Initialize the listener with configuration."""
         self.config = config
         self.subscriber = None
-        self.odoo_session = requests.Session()
+        self.odoo_session = None
         
-        # Set up Odoo session headers
-        self.odoo_session.headers.update({
-            'Content-Type': 'application/json',
-            'Authorization': f'Bearer {config["webhook_token"]}'
-        })
+        # Batched delivery: worker coroutines drain the queue in batches
+        self.batch_size = max(config.get('batch_size', 32), 1)
+        self.batch_timeout = config.get('batch_timeout_ms', 100) / 1000.0
+        # Enough workers to keep max_messages in flight
+        self.worker_count = max(1, -(-config.get('max_messages', 50) // self.batch_size))
+        self.loop = None
+        self._queue = None
         
         # Initialize Pub/Sub subscriber
         self._setup_subscriber()
@@ -60,88 +96,242 @@ class GchatListener:
             logger.info("Pub/Sub subscriber initialized successfully")
             
         except Exception as e:
-            logger.error(f"Failed to initialize Pub/Sub subscriber: {e}")
+            logger.error("Failed to initialize Pub/Sub subscriber: %s", e)
             raise
     
+    def _create_odoo_session(self) -> httpx.AsyncClient:
+        """Create the pooled HTTP/2 client used to reach Odoo."""
+        # Concurrent workers multiplex over pooled connections
+        max_connections = self.config.get('max_messages', 50)
+        return httpx.AsyncClient(
+            http2=True,
+            headers={
+                'Content-Type': 'application/json',
+                'Authorization': f'Bearer {self.config["webhook_token"]}'
+            },
+            timeout=self.config.get('timeout', 30),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections
+            )
+        )
+    
+    def _read_event_type(self, data: bytes) -> str:
+        """Validate event data and return its eventType.
+        
+        Large payloads are stream-parsed with ijson so that only eventType is
+        materialized; the raw bytes are forwarded to Odoo untouched either way.
+        
+        Raises ValueError when the data is not a JSON object.
+        """
+        if ijson and len(data) > STREAM_PARSE_THRESHOLD:
+            try:
+                events = ijson.parse(io.BytesIO(data))
+                _prefix, event, _value = next(events, ('', None, None))
+                if event != 'start_map':
+                    raise ValueError("event data is not a JSON object")
+                for prefix, event, value in events:
+                    if prefix == 'eventType':
+                        return value if event == 'string' else 'UNKNOWN'
+                return 'UNKNOWN'
+            except ijson.JSONError as e:
+                # Not a ValueError subclass; report it like malformed JSON
+                raise ValueError(str(e)) from e
+        
+        # orjson parses bytes directly
+        event_json = _loads(data)
+        if not isinstance(event_json, dict):
+            raise ValueError("event data is not a JSON object")
+        event_type = event_json.get('eventType')
+        return event_type if isinstance(event_type, str) else 'UNKNOWN'
+    
     def _format_webhook_payload(self, message) -> Dict[str, Any]:
         """Format Pub/Sub message for Odoo webhook."""
         try:
-            # Decode message data
-            data = message.data.decode('utf-8')
-            event_json = json.loads(data)
+            event_type = self._read_event_type(message.data)
+            logger.debug("Message %s carries %s event", message.message_id, event_type)
             
             # Format payload for Odoo webhook
             payload = {
                 'message_id': message.message_id,
                 'publish_time': message.publish_time.isoformat(),
                 'attributes': dict(message.attributes),
-                'data_base64': base64.b64encode(message.data).decode('utf-8')
+                'data_base64': base64.b64encode(message.data).decode('ascii')
             }
             
             return payload
             
         except Exception as e:
-            logger.error(f"Failed to format webhook payload: {e}")
+            logger.error("Failed to format webhook payload: %s", e)
             raise
     
-    def _send_to_odoo(self, payload: Dict[str, Any]) -> bool:
-        """Send payload to Odoo webhook."""
+    async def _send_to_odoo(self, message, payload) -> bool:
+        """Send one message to Odoo.
+        
+        Without a payload the message goes to the binary webhook: the event
+        bytes are the raw request body and the Pub/Sub metadata travels in
+        headers, so nothing is base64-encoded. Otherwise the formatted
+        payload is posted to the JSON webhook.
+        """
         try:
-            url = f"{self.config['odoo_url']}{self.config['webhook_path']}"
-            
-            response = self.odoo_session.post(
-                url,
-                json=payload,
-                timeout=self.config.get('timeout', 30)
-            )
+            if payload is None:
+                url = f"{self.config['odoo_url']}{self.config['binary_webhook_path']}"
+                response = await self.odoo_session.post(url, content=message.data, headers={
+                    'X-Gchat-Message-Id': message.message_id,
+                    'X-Gchat-Publish-Time': message.publish_time.isoformat(),
+                    # stdlib json keeps the header ASCII-only
+                    'X-Gchat-Attributes': json.dumps(dict(message.attributes)),
+                })
+            else:
+                url = f"{self.config['odoo_url']}{self.config['webhook_path']}"
+                response = await self.odoo_session.post(url, content=_dumps(payload))
             
             if response.status_code == 200:
-                logger.info(f"Successfully sent message {payload['message_id']} to Odoo")
+                logger.info("Successfully sent message %s to Odoo", message.message_id)
                 return True
             else:
-                logger.error(f"Failed to send message to Odoo: {response.status_code} - {response.text}")
+                logger.error("Failed to send message to Odoo: %s - %s", response.status_code, response.text)
                 return False
                 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Request error sending to Odoo: {e}")
+        except httpx.HTTPError as e:
+            logger.error("Request error sending to Odoo: %s", e)
             return False
         except Exception as e:
-            logger.error(f"Unexpected error sending to Odoo: {e}")
+            logger.error("Unexpected error sending to Odoo: %s", e)
             return False
     
-    def _process_message(self, message):
-        """Process a single Pub/Sub message."""
+    async def _send_batch_to_odoo(self, payloads) -> Dict[str, str]:
+        """Send a batch of payloads to the Odoo batch webhook.
+        
+        Returns a mapping of message_id to the status reported by Odoo
+        (OK, ERROR or BAD_REQUEST).
+        """
         try:
-            logger.info(f"Processing message {message.message_id}")
+            url = f"{self.config['odoo_url']}{self.config['batch_webhook_path']}"
             
-            # Format payload for Odoo
-            payload = self._format_webhook_payload(message)
+            response = await self.odoo_session.post(url, content=_dumps({'events': payloads}))
             
-            # Send to Odoo webhook
-            success = self._send_to_odoo(payload)
+            if response.status_code != 200:
+                logger.error("Failed to send batch to Odoo: %s - %s", response.status_code, response.text)
+                return {}
             
-            if success:
-                # Acknowledge message
-                message.ack()
-                logger.info(f"Message {message.message_id} processed successfully")
-            else:
-                # Negative acknowledgment - message will be retried
-                message.nack()
-                logger.warning(f"Message {message.message_id} failed, will retry")
-                
+            body = _loads(response.content)
+            result = body.get('result', body)
+            return {
+                item.get('message_id'): item.get('status')
+                for item in result.get('results', [])
+            }
+            
+        except httpx.HTTPError as e:
+            logger.error("Request error sending batch to Odoo: %s", e)
+            return {}
         except Exception as e:
-            logger.error(f"Error processing message {message.message_id}: {e}")
-            # Negative acknowledgment on error
-            message.nack()
+            logger.error("Unexpected error sending batch to Odoo: %s", e)
+            return {}
     
     def _message_callback(self, message):
-        """Callback function for received messages."""
+        """Callback for received messages; runs in a Pub/Sub thread."""
         try:
-            self._process_message(message)
+            if self.batch_size == 1 and self.config.get('binary_webhook_path'):
+                # Binary deliveries send the raw bytes; only validate them here
+                self._read_event_type(message.data)
+                payload = None
+            else:
+                payload = self._format_webhook_payload(message)
+            self.loop.call_soon_threadsafe(self._queue.put_nowait, (message, payload))
+        except ValueError as e:
+            # Malformed JSON or not an object: redelivery cannot fix it, so
+            # ack it instead of nacking it forever
+            logger.error("Dropping message %s with invalid event data: %s", message.message_id, e)
+            message.ack()
         except Exception as e:
-            logger.error(f"Error in message callback: {e}")
+            logger.error("Error in message callback: %s", e)
             message.nack()
     
+    async def _collect_batch(self):
+        """Collect up to batch_size queued messages, waiting at most batch_timeout."""
+        batch = [await self._queue.get()]
+        
+        deadline = self.loop.time() + self.batch_timeout
+        while len(batch) < self.batch_size:
+            remaining = deadline - self.loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        
+        return batch
+    
+    async def _deliver_batch(self, batch):
+        """Deliver queued messages and ack/nack each one by its reported status."""
+        if self.batch_size > 1:
+            results = await self._send_batch_to_odoo([payload for _, payload in batch])
+        else:
+            message, payload = batch[0]
+            delivered = await self._send_to_odoo(message, payload)
+            results = {message.message_id: 'OK' if delivered else 'ERROR'}
+        
+        failed = 0
+        for message, _payload in batch:
+            status = results.get(message.message_id)
+            if status in ACKED_STATUSES:
+                if status == 'BAD_REQUEST':
+                    # Odoo cannot decode it; redelivery would never succeed
+                    logger.error("Dropping message %s rejected by Odoo as a bad request", message.message_id)
+                message.ack()
+            else:
+                # Negative acknowledgment - message will be retried
+                message.nack()
+                failed += 1
+        
+        logger.info("Delivered %s messages (%s failed, will retry)", len(batch), failed)
+    
+    async def _worker(self):
+        """Drain the queue forever, one batch at a time."""
+        while True:
+            batch = await self._collect_batch()
+            try:
+                await self._deliver_batch(batch)
+            except Exception as e:
+                logger.error("Error delivering messages: %s", e)
+                for message, _payload in batch:
+                    message.nack()
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+    
+    async def _run(self, subscription_path):
+        """Run the streaming pull and the delivery workers until cancelled."""
+        self.loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self.odoo_session = self._create_odoo_session()
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.worker_count)]
+        
+        # Start the subscriber
+        streaming_pull_future = self.subscriber.subscribe(
+            subscription_path,
+            callback=self._message_callback,
+            flow_control=pubsub_v1.types.FlowControl(
+                max_messages=self.config.get('max_messages', 50)
+            )
+        )
+        
+        logger.info("Listening for messages on %s", subscription_path)
+        
+        try:
+            await asyncio.wrap_future(streaming_pull_future)
+        finally:
+            streaming_pull_future.cancel()
+            
+            # Deliver whatever is still queued before exiting
+            await self._queue.join()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await self.odoo_session.aclose()
+    
     def start_listening(self):
         """Start listening for Pub/Sub messages."""
         try:
@@ -150,28 +340,15 @@ class GchatListener:
                 self.config['subscription_name']
             )
             
-            logger.info(f"Starting to listen on subscription: {subscription_path}")
-            
-            # Start the subscriber
-            streaming_pull_future = self.subscriber.subscribe(
-                subscription_path,
-                callback=self._message_callback,
-                flow_control=pubsub_v1.types.FlowControl(
-                    max_messages=self.config.get('max_messages', 50)
-                )
-            )
-            
-            logger.info(f"Listening for messages on {subscription_path}")
+            logger.info("Starting to listen on subscription: %s", subscription_path)
             
             try:
-                # Keep the main thread alive
-                streaming_pull_future.result()
+                asyncio.run(self._run(subscription_path))
             except KeyboardInterrupt:
-                streaming_pull_future.cancel()
                 logger.info("Shutting down listener...")
                 
         except Exception as e:
-            logger.error(f"Error starting listener: {e}")
+            logger.error("Error starting listener: %s", e)
             raise
     
     def stop(self):
@@ -194,13 +371,22 @@ def parse_arguments():
     parser.add_argument('--odoo-url', required=True,
                        help='Odoo base URL (e.g., https://your-odoo.com)')
     parser.add_argument('--webhook', default='/gchat/webhook',
-                       help='Webhook path (default: /gchat/webhook)')
+                       help='Webhook path, used with --batch-size 1 (default: /gchat/webhook)')
+    parser.add_argument('--binary-webhook',
+                       help='Binary webhook path (e.g. /gchat/webhook/binary); with --batch-size 1, '
+                            'send the raw event body there instead of the JSON --webhook')
+    parser.add_argument('--batch-webhook', default='/gchat/webhook/batch',
+                       help='Batch webhook path (default: /gchat/webhook/batch)')
     parser.add_argument('--token', required=True,
                        help='Webhook authentication token')
     parser.add_argument('--timeout', type=int, default=30,
                        help='Request timeout in seconds (default: 30)')
     parser.add_argument('--max-messages', type=int, default=50,
                        help='Maximum messages to process concurrently (default: 50)')
+    parser.add_argument('--batch-size', type=int, default=32,
+                       help='Maximum messages per webhook request, 1 disables batching (default: 32)')
+    parser.add_argument('--batch-timeout-ms', type=int, default=100,
+                       help='Maximum time to wait while filling a batch (default: 100)')
     parser.add_argument('--log-level', default='INFO',
                        choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
                        help='Logging level (default: INFO)')
@@ -222,15 +408,19 @@ def main():
         'sa_json_path': args.sa_json,
         'odoo_url': args.odoo_url.rstrip('/'),
         'webhook_path': args.webhook,
+        'binary_webhook_path': args.binary_webhook,
+        'batch_webhook_path': args.batch_webhook,
         'webhook_token': args.token,
         'timeout': args.timeout,
-        'max_messages': args.max_messages
+        'max_messages': args.max_messages,
+        'batch_size': args.batch_size,
+        'batch_timeout_ms': args.batch_timeout_ms
     }
     
     logger.info("Starting Google Chat Pub/Sub Listener")
-    logger.info(f"Project: {config['gcp_project']}")
-    logger.info(f"Subscription: {config['subscription_name']}")
-    logger.info(f"Odoo URL: {config['odoo_url']}")
+    logger.info("Project: %s", config['gcp_project'])
+    logger.info("Subscription: %s", config['subscription_name'])
+    logger.info("Odoo URL: %s", config['odoo_url'])
     
     listener = None
     try:
@@ -241,7 +431,7 @@ def main():
     except KeyboardInterrupt:
         logger.info("Received interrupt signal, shutting down...")
     except Exception as e:
-        logger.error(f"Fatal error: {e}")
+        logger.error("Fatal error: %s", e)
         sys.exit(1)
     finally:
         if listener:
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """
+    Convert gchat_event_log.payload_json from text to jsonb in place.
+    
+    Without this, the ORM would move the text column aside and create an
+    empty jsonb one, hiding every historical payload. Rows that are not
+    valid JSON (or that jsonb refuses, e.g. \\u0000) are kept as a JSON
+    string instead of failing the upgrade.
+    """
+    cr.execute("""
+        SELECT data_type FROM information_schema.columns
+         WHERE table_name = 'gchat_event_log' AND column_name = 'payload_json'
+    """)
+    row = cr.fetchone()
+    if not row or row[0] == 'jsonb':
+        return
+    
+    cr.execute("""
+        CREATE OR REPLACE FUNCTION pg_temp.gchat_text_to_jsonb(value text) RETURNS jsonb AS $$
+        BEGIN
+            RETURN value::jsonb;
+        EXCEPTION WHEN others THEN
+            RETURN to_jsonb(value);
+        END;
+        $$ LANGUAGE plpgsql
+    """)
+    cr.execute("""
+        ALTER TABLE gchat_event_log
+        ALTER COLUMN payload_json TYPE jsonb
+        USING pg_temp.gchat_text_to_jsonb(NULLIF(payload_json, ''))
+    """)
+    _logger.info("Converted gchat_event_log.payload_json to jsonb")
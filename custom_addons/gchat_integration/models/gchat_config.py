@@ -1,16 +1,328 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
 import json
 import base64
+import hashlib
+import hmac
 import logging
+import re
+import time
+import uuid
 import urllib.parse
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
+from urllib.parse import quote
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from datetime import timedelta
-from dateutil.relativedelta import relativedelta
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+try:
+    import h2  # noqa: F401 - httpx only negotiates HTTP/2 when h2 is installed
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+try:
+    from google.oauth2 import service_account
+except ImportError:
+    service_account = None
 
 _logger = logging.getLogger(__name__)
 
+# Transport errors of whichever HTTP library backs the pooled clients
+_HTTP_ERRORS = (requests.exceptions.RequestException, httpx.HTTPError) if httpx else (requests.exceptions.RequestException,)
+# Gateway errors retried on idempotent GETs
+_RETRY_STATUSES = (502, 503, 504)
+
+# Tokens are refreshed inline when they expire within this margin
+TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+# The refresh cron (every 5 minutes) looks further ahead than the inline margin,
+# so the inline refresh is only a fallback for clock skew or a late cron run
+CRON_REFRESH_WINDOW = timedelta(minutes=10)
+
+# Chat REST API URLs, built once at import
+_CHAT_API_HOST = 'https://chat.googleapis.com'
+_CHAT_API_BASE = f'{_CHAT_API_HOST}/v1'
+_SPACES_URL = f'{_CHAT_API_BASE}/spaces'
+
+# Static half of the OAuth consent URL; only the per-config params are encoded per call
+_OAUTH_BASE = 'https://accounts.google.com/o/oauth2/v2/auth?response_type=code&access_type=offline&prompt=consent'
+DEFAULT_SCOPES = 'https://www.googleapis.com/auth/chat.messages.create https://www.googleapis.com/auth/chat.spaces.readonly'
+
+# Google Chat batch endpoint and the maximum sub-requests it accepts per call
+CHAT_BATCH_URL = f'{_CHAT_API_HOST}/batch/chat/v1'
+CHAT_BATCH_LIMIT = 100
+_BATCH_CONTENT_ID_RE = re.compile(rb'Content-ID:\s*<response-(\d+)>', re.IGNORECASE)
+
+# Shared read-only fallback for missing nested dicts in API error bodies
+_EMPTY = {}
+
+# list_spaces results per (database, config id) as (expires_at, spaces),
+# so back-to-back Test/List clicks reuse one API round-trip
+SPACES_CACHE_TTL = 30
+# Largest page the Chat API accepts for spaces.list
+SPACES_PAGE_SIZE = 1000
+_SPACES_CACHE = {}
+
+_OAUTH_TOKEN_URL = 'https://oauth2.googleapis.com/token'
+
+# DM space name per (database, config id, user identifier). DM spaces are
+# permanent, so repeat notifications to a user skip findDirectMessage.
+_DM_CACHE = {}
+
+# Process-local (access_token, expiry) per (database, config id). The DB row
+# stays the persistent store; warm-token calls never touch it.
+_TOKEN_CACHE = {}
+
+# Token-independent headers every Chat API client starts with; the
+# Authorization header is set on the client once per token
+_STATIC_HEADERS = {
+    'Content-Type': 'application/json',
+    'User-Agent': 'Odoo-GChat/1.0',
+}
+
+# Pooled HTTP sessions per (database, config id), reused across calls so
+# keep-alive connections to the Chat API skip the TCP/TLS handshake
+_SESSIONS = {}
+
+
+def _new_client(host, headers=None, retry=None):
+    """
+    Create a pooled HTTP client for one API host.
+    
+    Uses httpx (HTTP/2 when h2 is installed, so concurrent calls share one
+    multiplexed connection) and falls back to requests.Session.
+    
+    Args:
+        host (str): Scheme and host the pool is tuned for
+        headers (dict): Default headers sent with every request
+        retry (Retry): urllib3 retry policy for the requests fallback; httpx
+            retries gateway errors on GETs in _http_request instead
+        
+    Returns:
+        httpx.Client|requests.Session
+    """
+    if httpx:
+        transport = httpx.HTTPTransport(
+            http2=HTTP2_AVAILABLE,
+            retries=2,  # connection errors only
+            limits=httpx.Limits(max_connections=16, max_keepalive_connections=4),
+        )
+        return httpx.Client(transport=transport, timeout=30.0, headers=headers)
+    session = requests.Session()
+    session.mount(host, HTTPAdapter(max_retries=retry or 0, pool_connections=4, pool_maxsize=16))
+    if headers:
+        session.headers.update(headers)
+    return session
+
+
+def _http_request(client, method, url, body=None, **kwargs):
+    """
+    Send a request on a pooled client, whichever library backs it.
+    
+    Args:
+        client (httpx.Client|requests.Session): Client from _new_client
+        method (str): HTTP method
+        url (str): Absolute URL
+        body (bytes): Pre-encoded request body, if any
+        **kwargs: params, headers, timeout
+        
+    Returns:
+        httpx.Response|requests.Response
+    """
+    if httpx and isinstance(client, httpx.Client):
+        response = client.request(method, url, content=body, **kwargs)
+        # Mirror the urllib3 Retry of the requests fallback: idempotent GETs
+        # are retried on gateway errors with exponential backoff
+        attempt = 0
+        while method == 'GET' and response.status_code in _RETRY_STATUSES and attempt < 3:
+            time.sleep(0.3 * 2 ** attempt)
+            attempt += 1
+            response = client.request(method, url, content=body, **kwargs)
+        return response
+    return client.request(method, url, data=body, **kwargs)
+
+
+# Shared pooled client for the OAuth token endpoint. Kept apart from the
+# per-config Chat clients, whose default JSON Content-Type and Bearer
+# header must not leak into the form-encoded token requests.
+_OAUTH_CLIENT = _new_client(
+    'https://oauth2.googleapis.com',
+    retry=Retry(total=2, backoff_factor=0.3, status_forcelist=_RETRY_STATUSES),
+)
+
+
+@lru_cache(maxsize=1024)
+def _encode_user_identifier(user_identifier):
+    """Chat user resource name for an email ('users/<quoted email>') or a users/ id."""
+    return f"users/{quote(user_identifier)}" if "@" in user_identifier else user_identifier
+
+
+def _json_dumps(obj):
+    """Serialize a request body to JSON bytes, using orjson when available."""
+    if orjson:
+        return orjson.dumps(obj)
+    return json.dumps(obj).encode('utf-8')
+
+
+def _json_loads(content):
+    """Parse a JSON response body (bytes), using orjson when available."""
+    if orjson:
+        return orjson.loads(content)
+    return json.loads(content)
+
+
+def _chat_error_message(e, op):
+    """
+    Build the error message for a failed Chat API call.
+    
+    Args:
+        e (Exception): The raised requests/httpx error
+        op (str): Description of the failed operation
+        
+    Returns:
+        str: Message including the API error detail when the response has one
+    """
+    error_msg = f"{op}: {str(e)}"
+    # Response.__bool__ is False for 4xx/5xx, so compare against None
+    resp = getattr(e, 'response', None)
+    if resp is None:
+        return error_msg
+    try:
+        err = _json_loads(resp.content).get('error') or _EMPTY
+        message = err.get('message', 'Unknown error')
+    except (ValueError, AttributeError):
+        return f"{error_msg} - Status: {resp.status_code}"
+    return f"{error_msg} - {message}"
+
+
+def _session_get_json(session, url, params=None):
+    """GET a Chat API URL on an authorized session and return the parsed body (no ORM)."""
+    response = _http_request(session, 'GET', url, params=params, timeout=30)
+    response.raise_for_status()
+    return _json_loads(response.content)
+
+
+def _card_message(title, subtitle=None, items=None, button_text=None, button_url=None, thread_key=None):
+    """
+    Build a cardsV2 message body.
+    
+    Args:
+        title (str): Card title, also used as the fallback text
+        subtitle (str): Card subtitle (optional)
+        items (list): List of text items to display
+        button_text (str): Button text (optional)
+        button_url (str): Button URL (optional)
+        thread_key (str): Thread key for threading (optional)
+        
+    Returns:
+        dict: Message body for spaces.messages.create
+    """
+    card_widgets = []
+    
+    # items
+    for it in (items or []):
+        card_widgets.append({"decoratedText": {"text": it}})
+    
+    # button
+    if button_text and button_url:
+        card_widgets.append({
+            "buttonList": {
+                "buttons": [{
+                    "text": button_text,
+                    "onClick": {"openLink": {"url": button_url}}
+                }]
+            }
+        })
+
+    card = {
+        "cardId": "odoo_notify",
+        "card": {
+            "header": { 
+                "title": title, 
+                **({"subtitle": subtitle} if subtitle else {}) 
+            },
+            "sections": [{ 
+                "widgets": card_widgets or [{"decoratedText": {"text": " "}}] 
+            }]
+        }
+    }
+
+    body = {
+        "text": title,
+        "cardsV2": [card],
+    }
+    
+    if thread_key:
+        body["thread"] = {"threadKey": str(thread_key)}
+    return body
+
+
+def _iter_spaces(get_page, page_size=SPACES_PAGE_SIZE):
+    """
+    Yield spaces lazily, following nextPageToken.
+    
+    The next page is only requested once the caller has consumed the current one.
+    
+    Args:
+        get_page (callable): Takes params=<query dict> and returns the
+            parsed spaces.list page
+        page_size (int): Spaces requested per page
+        
+    Yields:
+        dict: Space resources
+    """
+    params = {'pageSize': page_size}
+    while True:
+        result = get_page(params=params)
+        yield from result.get('spaces', ())
+        page_token = result.get('nextPageToken')
+        if not page_token:
+            return
+        params['pageToken'] = page_token
+
+
+def _parse_batch_response(content_type, content):
+    """
+    Split a multipart/mixed batch response into its sub-responses.
+    
+    Args:
+        content_type (str): Content-Type header of the batch response
+        content (bytes): Raw batch response body
+        
+    Returns:
+        dict: {sub-request index: (HTTP status, parsed JSON body)}
+    """
+    boundary = content_type.split('boundary=', 1)[1].strip('"').encode()
+    responses = {}
+    for part in content.split(b'--' + boundary)[1:]:
+        if part.startswith(b'--'):
+            break
+        part_headers, _, http_response = part.strip().partition(b'\r\n\r\n')
+        match = _BATCH_CONTENT_ID_RE.search(part_headers)
+        status_line, _, rest = http_response.partition(b'\r\n')
+        _headers, _, body = rest.partition(b'\r\n\r\n')
+        if not match:
+            continue
+        try:
+            payload = _json_loads(body) if body.strip() else {}
+        except ValueError:
+            payload = {'error': {'message': body.decode('utf-8', 'replace')}}
+        responses[int(match.group(1))] = (int(status_line.split()[1]), payload)
+    return responses
+
 
 class GchatConfig(models.Model):
     _name = 'gchat.config'
@@ -28,8 +340,8 @@ class GchatConfig(models.Model):
         ('oauth', 'OAuth 2.0')
     ], string='Authentication Mode', required=True, default='oauth')
     
-    # Service Account fields
-    sa_json = fields.Binary('Service Account JSON', attachment=True)
+    # Service Account fields (not prefetched: the blob is only read when building SA credentials)
+    sa_json = fields.Binary('Service Account JSON', attachment=True, prefetch=False)
     sa_json_filename = fields.Char('SA JSON Filename')
     
     # OAuth fields
@@ -40,8 +352,8 @@ class GchatConfig(models.Model):
     token_expiry = fields.Datetime('Token Expiry')
     
     # API Configuration
-    scopes = fields.Text('Scopes', default='https://www.googleapis.com/auth/chat.messages.create https://www.googleapis.com/auth/chat.spaces.readonly')
-    webhook_token = fields.Char('Webhook Token', 
+    scopes = fields.Text('Scopes', default=DEFAULT_SCOPES)
+    webhook_token = fields.Char('Webhook Token', index=True,
                                help='Token for webhook authentication (optional for OAuth mode)')
     
     # Status fields
@@ -54,49 +366,232 @@ class GchatConfig(models.Model):
     error_message = fields.Text('Last Error')
 
     _sql_constraints = [
-        ('unique_company_config', 'unique(company_id)', 
-         'Only one configuration per company is allowed.')
+        ('oauth_fields_present',
+         "CHECK (auth_mode <> 'oauth' OR (COALESCE(oauth_client_id, '') <> '' AND COALESCE(oauth_client_secret, '') <> ''))",
+         'OAuth Client ID and Secret are required for OAuth mode.')
     ]
 
-    @api.constrains('auth_mode', 'sa_json', 'oauth_client_id', 'oauth_client_secret')
+    def _auto_init(self):
+        res = super()._auto_init()
+        # Only one *active* configuration per company; inactive rows are kept as history.
+        # The partial unique index also serves the active-config-per-company lookup.
+        self.env.cr.execute("ALTER TABLE gchat_config DROP CONSTRAINT IF EXISTS gchat_config_unique_company_config")
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS gchat_config_company_active_uniq
+            ON gchat_config (company_id) WHERE is_active
+        """)
+        return res
+
+    @api.constrains('auth_mode', 'sa_json')
     def _check_auth_configuration(self):
-        """Validate authentication configuration based on mode."""
+        """Validate service account configuration (the OAuth part is a SQL CHECK)."""
+        sa_mode = self.filtered(lambda c: c.auth_mode == 'service_account')
+        # sa_json_filename is a cheap proxy for presence; only confirm the
+        # suspects against the attachment (bin_size: size only, not the blob)
+        missing = sa_mode.filtered(lambda c: not c.sa_json_filename)
+        if missing and not all(rec['sa_json'] for rec in missing.with_context(bin_size=True).read(['sa_json'])):
+            raise ValidationError(_('Service Account JSON is required for service account mode.'))
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.clear_caches()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'access_token', 'token_expiry', 'refresh_token'}.intersection(vals):
+            for config in self:
+                _TOKEN_CACHE.pop((self.env.cr.dbname, config.id), None)
+        if {'webhook_token', 'is_active', 'company_id', 'sa_json', 'scopes'}.intersection(vals):
+            self.clear_caches()
+        return res
+
+    def unlink(self):
         for config in self:
-            if config.auth_mode == 'service_account':
-                if not config.sa_json:
-                    raise ValidationError(_('Service Account JSON is required for service account mode.'))
-            elif config.auth_mode == 'oauth':
-                if not config.oauth_client_id or not config.oauth_client_secret:
-                    raise ValidationError(_('OAuth Client ID and Secret are required for OAuth mode.'))
-
-    def _base_url(self):
-        """Return base URL for Google Chat API."""
-        return "https://chat.googleapis.com/v1"
-
-    def _headers(self):
-        """Return headers for API requests."""
+            _SPACES_CACHE.pop((self.env.cr.dbname, config.id), None)
+            _TOKEN_CACHE.pop((self.env.cr.dbname, config.id), None)
+            for dm_key in [k for k in _DM_CACHE if k[:2] == (self.env.cr.dbname, config.id)]:
+                _DM_CACHE.pop(dm_key, None)
+            session = _SESSIONS.pop((self.env.cr.dbname, config.id), None)
+            if session:
+                session.close()
+        res = super().unlink()
+        self.clear_caches()
+        return res
+
+    @api.model
+    @tools.ormcache('company_id')
+    def _get_active_config_id(self, company_id):
+        """Return the id of the active configuration of a company, or False."""
+        return self.sudo().search([
+            ('company_id', '=', company_id),
+            ('is_active', '=', True)
+        ], limit=1).id
+
+    @api.model
+    def _get_for_company(self, company_id):
+        """
+        Get the active configuration of a company without searching each time.
+        
+        Args:
+            company_id (int): res.company id
+            
+        Returns:
+            gchat.config: Active configuration or empty recordset
+        """
+        return self.browse(self._get_active_config_id(company_id))
+
+    @api.model
+    @tools.ormcache()
+    def _get_webhook_token_map(self):
+        """Return {sha256(webhook_token): (config_id, webhook_token)} for active configs."""
+        configs = self.sudo().search_read([
+            ('is_active', '=', True),
+            ('webhook_token', '!=', False)
+        ], ['webhook_token'])
         return {
-            "Authorization": f"Bearer {self._ensure_access_token()}",
-            "Content-Type": "application/json",
-            "User-Agent": "Odoo-GChat/1.0",
+            hashlib.sha256(config['webhook_token'].encode()).hexdigest(): (config['id'], config['webhook_token'])
+            for config in configs
         }
 
+    @api.model
+    def _resolve_webhook_token(self, token):
+        """
+        Find the active configuration owning a webhook token.
+        
+        Args:
+            token (str): Bearer token received by the webhook
+            
+        Returns:
+            gchat.config: Matching configuration or empty recordset
+        """
+        if not token:
+            return self.browse()
+        
+        entry = self._get_webhook_token_map().get(hashlib.sha256(token.encode()).hexdigest())
+        if entry and hmac.compare_digest(entry[1], token):
+            return self.browse(entry[0])
+        return self.browse()
+
+    def _get_session(self):
+        """Return the pooled HTTP client (httpx or requests) for this configuration."""
+        self.ensure_one()
+        key = (self.env.cr.dbname, self.id)
+        session = _SESSIONS.get(key)
+        if session is None:
+            # Transient gateway errors on idempotent GETs are retried with backoff;
+            # POSTs (send_chat, create_space) are not idempotent and never retried
+            retry = Retry(total=3, backoff_factor=0.3, status_forcelist=_RETRY_STATUSES,
+                          allowed_methods=frozenset(['GET']), raise_on_status=False)
+            session = _new_client(_CHAT_API_HOST, _STATIC_HEADERS, retry)
+            session.gchat_token = None
+            session = _SESSIONS.setdefault(key, session)
+        return session
+
+    def _authorized_session(self, token=None):
+        """
+        Return the pooled session carrying the current Authorization header.
+        
+        The header is only rebuilt when the token differs from the one
+        on the session (refreshed here, by the cron or by another worker).
+        
+        Args:
+            token (str): Access token to use; defaults to the stored one
+        """
+        session = self._get_session()
+        token = token or self.access_token
+        if session.gchat_token != token:
+            session.headers['Authorization'] = f'Bearer {token}'
+            session.gchat_token = token
+        return session
+
     def _ensure_access_token(self):
         """Return valid access_token; refresh if expired (<= 5 min)."""
         self.ensure_one()
+        key = (self.env.cr.dbname, self.id)
+        cached = _TOKEN_CACHE.get(key)
+        if cached and cached[1] - TOKEN_REFRESH_MARGIN > fields.Datetime.now():
+            return cached[0]
+        # Cache miss/stale: the row may hold a token refreshed by the cron or another worker
         if not self.access_token or self._is_expired():
-            self._refresh_token()
+            return self._refresh_token()
+        _TOKEN_CACHE[key] = (self.access_token, self.token_expiry)
         return self.access_token
 
+    def _exchange_oauth_code(self, code, redirect_uri):
+        """
+        Exchange an OAuth authorization code for tokens.
+        
+        Goes through the shared _OAUTH_CLIENT, like _refresh_token. The
+        response is returned even for HTTP errors, since Google reports
+        them in the body ('error', 'error_description').
+        
+        Args:
+            code (str): Authorization code received by the callback
+            redirect_uri (str): Redirect URI sent with the consent request
+            
+        Returns:
+            dict: Token endpoint response
+        """
+        self.ensure_one()
+        data = {
+            'code': code,
+            'client_id': self.oauth_client_id,
+            'client_secret': self.oauth_client_secret,
+            'redirect_uri': redirect_uri,
+            'grant_type': 'authorization_code'
+        }
+        r = _OAUTH_CLIENT.post(_OAUTH_TOKEN_URL, data=data, timeout=20)
+        return _json_loads(r.content)
+
+    def _store_oauth_tokens(self, token_info):
+        """
+        Store the tokens of an OAuth authorization-code exchange.
+        
+        Written with a plain UPDATE (no ORM write, recompute or cache
+        clearing); the process-local token cache is dropped so the next
+        API call uses the new access token instead of a revoked one.
+        
+        Args:
+            token_info (dict): Token endpoint response with access_token,
+                refresh_token and expires_in
+        """
+        self.ensure_one()
+        token_expiry = fields.Datetime.now() + timedelta(seconds=int(token_info.get('expires_in', 3600)))
+        self.env.cr.execute(
+            "UPDATE gchat_config SET access_token = %s, refresh_token = %s, token_expiry = %s, "
+            "write_date = (now() at time zone 'UTC') WHERE id = %s",
+            (token_info.get('access_token'), token_info.get('refresh_token'), token_expiry, self.id),
+        )
+        self.invalidate_recordset(['access_token', 'refresh_token', 'token_expiry', 'write_date'])
+        _TOKEN_CACHE.pop((self.env.cr.dbname, self.id), None)
+
+    def _api_token(self):
+        """
+        Return the access token for a Chat API call.
+        
+        OAuth tokens are refreshed when needed; other modes use the stored token.
+        """
+        token = self._ensure_access_token() if self.auth_mode == 'oauth' else self.access_token
+        if not token:
+            raise UserError(_('Access token not found. Please authenticate with Google first.'))
+        return token
+
     def _is_expired(self):
         """Check if token is expired (with 5 min safety margin)."""
         if not self.token_expiry:
             return True
         # an toàn: trừ 5 phút
-        return fields.Datetime.now() >= (self.token_expiry - relativedelta(minutes=5))
+        return fields.Datetime.now() >= (self.token_expiry - TOKEN_REFRESH_MARGIN)
 
     def _refresh_token(self):
-        """OAuth refresh_token → access_token."""
+        """
+        OAuth refresh_token → access_token.
+        
+        Returns:
+            str: The new access token
+        """
         self.ensure_one()
         if not self.refresh_token:
             raise UserError(_('No refresh token available. Please re-authenticate with Google.'))
@@ -109,55 +604,76 @@ class GchatConfig(models.Model):
         }
         
         try:
-            r = requests.post("https://oauth2.googleapis.com/token", data=data, timeout=20)
+            r = _OAUTH_CLIENT.post(_OAUTH_TOKEN_URL, data=data, timeout=20)
             r.raise_for_status()
-            tok = r.json()
+            tok = _json_loads(r.content)
             
-            self.sudo().write({
-                "access_token": tok.get("access_token"),
-                "token_expiry": fields.Datetime.now() + relativedelta(seconds=int(tok.get("expires_in", 3600))),
-            })
+            access_token = tok.get("access_token")
+            token_expiry = fields.Datetime.now() + timedelta(seconds=int(tok.get("expires_in", 3600)))
+            _TOKEN_CACHE[(self.env.cr.dbname, self.id)] = (access_token, token_expiry)
+            # Persist with a plain UPDATE: no ORM write, recompute or cache clearing
+            self.env.cr.execute(
+                "UPDATE gchat_config SET access_token = %s, token_expiry = %s, "
+                "write_date = (now() at time zone 'UTC') WHERE id = %s",
+                (access_token, token_expiry, self.id),
+            )
+            self.invalidate_recordset(['access_token', 'token_expiry', 'write_date'])
+            self._authorized_session(access_token)
             
-            _logger.info(f"Token refreshed successfully for config {self.name}")
+            _logger.info("Token refreshed successfully for config %s", self.name)
+            return access_token
             
-        except requests.exceptions.RequestException as e:
+        except _HTTP_ERRORS as e:
             error_msg = f"Failed to refresh token: {str(e)}"
-            if hasattr(e, 'response') and e.response:
+            # Response.__bool__ is False for 4xx/5xx, so compare against None
+            resp = getattr(e, 'response', None)
+            if resp is not None:
                 try:
-                    error_detail = e.response.json()
+                    error_detail = _json_loads(resp.content)
                     error_msg += f" - {error_detail.get('error_description', error_detail.get('error', 'Unknown error'))}"
-                except:
-                    error_msg += f" - Status: {e.response.status_code}"
+                except (ValueError, AttributeError):
+                    error_msg += f" - Status: {resp.status_code}"
             
             _logger.error(error_msg)
             raise UserError(error_msg)
 
-    def _request(self, method, url, json_payload=None, retry_on_401=True):
-        """Make HTTP request with automatic token refresh on 401."""
+    def _request(self, method, url, json_payload=None, params=None, op="Request failed", retry_on_401=True):
+        """
+        Make a Chat API request on the pooled session with automatic token refresh on 401.
+        
+        Args:
+            method (str): HTTP method
+            url (str): Absolute API URL
+            json_payload (dict): JSON body, if any
+            params (dict): Query parameters, if any
+            op (str): Description of the operation, used in error messages
+            retry_on_401 (bool): Refresh the OAuth token and retry once on 401
+            
+        Returns:
+            dict: Parsed JSON response ({} for an empty body)
+        """
         self.ensure_one()
         
-        headers = self._headers()
+        token = self._api_token()
+        data = _json_dumps(json_payload) if json_payload is not None else None
         
         try:
-            r = requests.request(method, url, headers=headers, json=json_payload, timeout=30)
+            # No per-call headers: Content-Type, User-Agent and Authorization
+            # are session defaults, so the client skips the header merge
+            r = _http_request(self._authorized_session(token), method, url, data, params=params, timeout=30)
             
-            if r.status_code == 401 and retry_on_401:
+            if r.status_code == 401 and retry_on_401 and self.auth_mode == 'oauth':
                 # refresh & retry once
-                _logger.info(f"Token expired, refreshing and retrying request to {url}")
-                self._refresh_token()
-                headers = self._headers()
-                r = requests.request(method, url, headers=headers, json=json_payload, timeout=30)
+                _logger.info("Token expired, refreshing and retrying request to %s", url)
+                token = self._refresh_token()
+                r = _http_request(self._authorized_session(token), method, url, data, params=params, timeout=30)
             
             # raise for non-2xx
-            if r.status_code // 100 != 2:
-                error_msg = f"GChat API {r.status_code}: {r.text[:500]}"
-                _logger.error(f"API request failed: {error_msg}")
-                raise UserError(error_msg)
-            
-            return r.json() if r.text else {}
+            r.raise_for_status()
+            return _json_loads(r.content) if r.content else {}
             
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Request failed: {str(e)}"
+        except _HTTP_ERRORS as e:
+            error_msg = _chat_error_message(e, op)
             _logger.error(error_msg)
             raise UserError(error_msg)
 
@@ -173,24 +689,28 @@ class GchatConfig(models.Model):
         """
         self.ensure_one()
         
-        base = self._base_url()
+        cache_key = (self.env.cr.dbname, self.id, user_identifier)
+        space_id = _DM_CACHE.get(cache_key)
+        if space_id:
+            return space_id
+        
         # nếu là email: cần URL-encode. name='users/{email}'
-        from urllib.parse import quote
-        name = f"users/{quote(user_identifier)}" if "@" in user_identifier else user_identifier
-        url = f"{base}/spaces:findDirectMessage?name={name}"
+        name = _encode_user_identifier(user_identifier)
+        url = f"{_SPACES_URL}:findDirectMessage?name={name}"
         
         try:
             resp = self._request("GET", url)
             # resp.name là 'spaces/AAAA...'
             space_id = resp.get("name")
             if space_id:
-                _logger.info(f"Found DM space {space_id} for user {user_identifier}")
+                _logger.info("Found DM space %s for user %s", space_id, user_identifier)
+                _DM_CACHE[cache_key] = space_id
                 return space_id
             else:
                 raise UserError(f"Could not find or create DM space for user {user_identifier}")
                 
         except Exception as e:
-            _logger.error(f"Failed to find/create DM for user {user_identifier}: {str(e)}")
+            _logger.error("Failed to find/create DM for user %s: %s", user_identifier, e)
             raise
 
     def send_card_dm(self, space_id, *, title, subtitle=None, items=None, button_text=None, button_url=None, thread_key=None):
@@ -211,54 +731,16 @@ class GchatConfig(models.Model):
         """
         self.ensure_one()
         
-        base = self._base_url()
-        url = f"{base}/{space_id}/messages"
-
-        card_widgets = []
-        
-        # items
-        for it in (items or []):
-            card_widgets.append({"decoratedText": {"text": it}})
-        
-        # button
-        if button_text and button_url:
-            card_widgets.append({
-                "buttonList": {
-                    "buttons": [{
-                        "text": button_text,
-                        "onClick": {"openLink": {"url": button_url}}
-                    }]
-                }
-            })
-
-        card = {
-            "cardId": "odoo_notify",
-            "card": {
-                "header": { 
-                    "title": title, 
-                    **({"subtitle": subtitle} if subtitle else {}) 
-                },
-                "sections": [{ 
-                    "widgets": card_widgets or [{"decoratedText": {"text": " "}}] 
-                }]
-            }
-        }
-
-        body = {
-            "text": title,
-            "cardsV2": [card],
-        }
-        
-        if thread_key:
-            body["thread"] = {"threadKey": str(thread_key)}
+        url = f"{_CHAT_API_BASE}/{space_id}/messages"
+        body = _card_message(title, subtitle, items, button_text, button_url, thread_key)
 
         try:
             resp = self._request("POST", url, json_payload=body)
-            _logger.info(f"Card message sent successfully to {space_id}")
+            _logger.info("Card message sent successfully to %s", space_id)
             return resp
             
         except Exception as e:
-            _logger.error(f"Failed to send card message to {space_id}: {str(e)}")
+            _logger.error("Failed to send card message to %s: %s", space_id, e)
             raise
 
     def send_card_to_user(self, user_email, **kwargs):
@@ -278,24 +760,57 @@ class GchatConfig(models.Model):
         if not space_id:
             raise UserError("Không tìm thấy hoặc tạo được DM space cho user này.")
         
-        return self.send_card_dm(space_id, **kwargs)
+        try:
+            return self.send_card_dm(space_id, **kwargs)
+        except UserError:
+            # The cached DM space may be gone; look it up again next time
+            _DM_CACHE.pop((self.env.cr.dbname, self.id, user_email), None)
+            raise
+
+    @tools.ormcache('self.id')
+    def _parsed_sa_info(self):
+        """
+        Parse the service account JSON, cached per config.
+        
+        Only the decoded key info is cached: Credentials are refreshed in
+        place, so get_client builds a fresh one per call instead of sharing
+        one across threads and requests. The cache is cleared by write()
+        when sa_json changes.
+        
+        Returns:
+            dict: Service account key info
+        """
+        sa_json = self.read(['sa_json'])[0]['sa_json']
+        if not sa_json:
+            raise UserError(_('Service Account JSON is required for service account mode.'))
+        return json.loads(base64.b64decode(sa_json))
 
     def get_client(self, as_user=None):
         """
-        Get Google API client for authentication.
+        Get Google API credentials for authentication.
         
         Args:
             as_user (str): Email to impersonate (for service account)
             
         Returns:
-            Google API client instance
+            google.oauth2.service_account.Credentials: Fresh credentials in
+                service account mode, None in OAuth mode
         """
-        # TODO: Implement Google API client creation
-        # - For service account: use sa_json
-        # - For OAuth: use refresh_token to get access_token
-        # - Handle impersonation if as_user provided
-        _logger.info(f"Getting Google API client for config {self.name}")
-        return None
+        self.ensure_one()
+        if self.auth_mode != 'service_account':
+            # OAuth mode talks to the REST API directly through _get_session()
+            return None
+        if service_account is None:
+            raise UserError(_('google-auth is required for service account mode.'))
+        
+        # TODO: Build the Google API client on these credentials
+        creds = service_account.Credentials.from_service_account_info(
+            self._parsed_sa_info(), scopes=(self.scopes or '').split()
+        )
+        if as_user:
+            creds = creds.with_subject(as_user)
+        _logger.info("Getting Google API credentials for config %s", self.name)
+        return creds
 
     def send_chat(self, space_id, text=None, cards=None, thread_key=None):
         """
@@ -312,12 +827,6 @@ class GchatConfig(models.Model):
         """
         self.ensure_one()
         
-        if not self.access_token:
-            raise UserError(_('Access token not found. Please authenticate with Google first.'))
-        
-        # Refresh token if needed
-        self.refresh_if_needed()
-        
         # Prepare message data
         message_data = {}
         
@@ -334,39 +843,114 @@ class GchatConfig(models.Model):
         if not message_data:
             raise UserError(_('Message must contain either text or cards.'))
         
-        # Prepare headers
-        headers = {
-            'Authorization': f'Bearer {self.access_token}',
-            'Content-Type': 'application/json'
+        # Send message
+        result = self._request(
+            'POST', f'{_SPACES_URL}/{space_id}/messages',
+            json_payload=message_data, op="Failed to send message to Google Chat"
+        )
+        _logger.info("Message sent successfully to space %s: %s", space_id, result.get('name', 'Unknown'))
+        
+        return {
+            'success': True,
+            'message_id': result.get('name', ''),
+            'response': result
         }
+
+    def send_chat_batch(self, messages):
+        """
+        Send several messages in one HTTP request via the Chat batch endpoint.
         
-        # Send message
-        url = f'https://chat.googleapis.com/v1/spaces/{space_id}/messages'
+        Args:
+            messages (list): (space_id, message_data, thread_key) tuples where
+                message_data is the message body, e.g. {'text': ...}
+                
+        Returns:
+            list: Per-message results in input order, each a dict with
+                'success' and either 'message_id'/'response' or 'error'.
+                A failed request only fails the messages of its own chunk,
+                so results of chunks already sent are never lost.
+        """
+        self.ensure_one()
+        
+        if not messages:
+            return []
+        
+        token = self._api_token()
+        results = []
+        for start in range(0, len(messages), CHAT_BATCH_LIMIT):
+            chunk = messages[start:start + CHAT_BATCH_LIMIT]
+            try:
+                results.extend(self._send_chat_batch_chunk(chunk, token))
+            except UserError as e:
+                results.extend({'success': False, 'error': str(e)} for _message in chunk)
+        return results
+
+    def _send_chat_batch_chunk(self, messages, token):
+        """Send up to CHAT_BATCH_LIMIT messages as one multipart/mixed request."""
+        boundary = f"batch_{uuid.uuid4().hex}"
+        parts = []
+        for index, (space_id, message_data, thread_key) in enumerate(messages):
+            body = dict(message_data)
+            # Add thread key only for service account (not for OAuth user)
+            if thread_key and self.auth_mode == 'service_account':
+                body['threadKey'] = thread_key
+            parts.append((
+                f"--{boundary}\r\n"
+                f"Content-Type: application/http\r\n"
+                f"Content-ID: <{index}>\r\n\r\n"
+                f"POST /v1/spaces/{space_id}/messages HTTP/1.1\r\n"
+                f"Content-Type: application/json\r\n\r\n"
+            ).encode('utf-8') + _json_dumps(body) + b"\r\n")
+        parts.append(f"--{boundary}--\r\n".encode('utf-8'))
+        
+        # Only the Content-Type differs from the session defaults
+        headers = {'Content-Type': f'multipart/mixed; boundary={boundary}'}
         
         try:
-            response = requests.post(url, headers=headers, json=message_data, timeout=30)
+            response = _http_request(
+                self._authorized_session(token), 'POST', CHAT_BATCH_URL, b''.join(parts), headers=headers, timeout=30
+            )
             response.raise_for_status()
+            sub_responses = _parse_batch_response(response.headers.get('Content-Type', ''), response.content)
             
-            result = response.json()
-            _logger.info(f"Message sent successfully to space {space_id}: {result.get('name', 'Unknown')}")
-            
-            return {
-                'success': True,
-                'message_id': result.get('name', ''),
-                'response': result
-            }
-            
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Failed to send message to Google Chat: {str(e)}"
-            if hasattr(e, 'response') and e.response:
-                try:
-                    error_detail = e.response.json()
-                    error_msg += f" - {error_detail.get('error', {}).get('message', 'Unknown error')}"
-                except:
-                    error_msg += f" - Status: {e.response.status_code}"
-            
+        except _HTTP_ERRORS + (IndexError, ValueError) as e:
+            error_msg = f"Failed to send message batch to Google Chat: {str(e)}"
             _logger.error(error_msg)
             raise UserError(error_msg)
+        
+        results = []
+        for index in range(len(messages)):
+            status, payload = sub_responses.get(index, (0, {}))
+            if status // 100 == 2:
+                results.append({
+                    'success': True,
+                    'message_id': payload.get('name', ''),
+                    'response': payload
+                })
+            else:
+                results.append({
+                    'success': False,
+                    'error': (payload.get('error') or _EMPTY).get('message') or f"Status: {status}"
+                })
+        
+        _logger.info("Sent batch of %s messages, %s succeeded", len(messages), sum(r['success'] for r in results))
+        return results
+
+    def iter_spaces(self, page_size=SPACES_PAGE_SIZE):
+        """
+        Iterate over the spaces visible to this configuration, one API page at a time.
+        
+        Args:
+            page_size (int): Spaces requested per page
+            
+        Returns:
+            generator: Space resources; pages are fetched as the caller consumes them
+        """
+        self.ensure_one()
+        return _iter_spaces(
+            partial(self._request, 'GET', _SPACES_URL, op="Failed to list Google Chat spaces"),
+            page_size,
+        )
 
     def list_spaces(self):
         """
@@ -377,41 +961,16 @@ class GchatConfig(models.Model):
         """
         self.ensure_one()
         
-        if not self.access_token:
-            raise UserError(_('Access token not found. Please authenticate with Google first.'))
-        
-        # Refresh token if needed
-        self.refresh_if_needed()
+        cache_key = (self.env.cr.dbname, self.id)
+        entry = _SPACES_CACHE.get(cache_key)
+        if entry and entry[0] > time.monotonic():
+            return entry[1]
         
-        headers = {
-            'Authorization': f'Bearer {self.access_token}',
-            'Content-Type': 'application/json'
-        }
+        spaces = list(self.iter_spaces())
+        _logger.info("Retrieved %s spaces from Google Chat", len(spaces))
         
-        url = 'https://chat.googleapis.com/v1/spaces'
-        
-        try:
-            response = requests.get(url, headers=headers, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            spaces = result.get('spaces', [])
-            
-            _logger.info(f"Retrieved {len(spaces)} spaces from Google Chat")
-            
-            return spaces
-            
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Failed to list Google Chat spaces: {str(e)}"
-            if hasattr(e, 'response') and e.response:
-                try:
-                    error_detail = e.response.json()
-                    error_msg += f" - {error_detail.get('error', {}).get('message', 'Unknown error')}"
-                except:
-                    error_msg += f" - Status: {e.response.status_code}"
-            
-            _logger.error(error_msg)
-            raise UserError(error_msg)
+        _SPACES_CACHE[cache_key] = (time.monotonic() + SPACES_CACHE_TTL, spaces)
+        return spaces
 
     def create_space(self, display_name, description=None):
         """
@@ -426,12 +985,6 @@ class GchatConfig(models.Model):
         """
         self.ensure_one()
         
-        if not self.access_token:
-            raise UserError(_('Access token not found. Please authenticate with Google first.'))
-        
-        # Refresh token if needed
-        self.refresh_if_needed()
-        
         # Prepare space data
         space_data = {
             'displayName': display_name,
@@ -441,65 +994,116 @@ class GchatConfig(models.Model):
         if description:
             space_data['description'] = description
         
-        headers = {
-            'Authorization': f'Bearer {self.access_token}',
-            'Content-Type': 'application/json'
-        }
+        result = self._request('POST', _SPACES_URL, json_payload=space_data, op="Failed to create Google Chat space")
+        _logger.info("Space created successfully: %s", result.get('name', 'Unknown'))
+        _SPACES_CACHE.pop((self.env.cr.dbname, self.id), None)
         
-        url = 'https://chat.googleapis.com/v1/spaces'
-        
-        try:
-            response = requests.post(url, headers=headers, json=space_data, timeout=30)
-            response.raise_for_status()
-            
-            result = response.json()
-            _logger.info(f"Space created successfully: {result.get('name', 'Unknown')}")
-            
-            return {
-                'success': True,
-                'space_id': result.get('name', ''),
-                'display_name': result.get('displayName', ''),
-                'type': result.get('type', ''),
-                'response': result
-            }
-            
-        except requests.exceptions.RequestException as e:
-            error_msg = f"Failed to create Google Chat space: {str(e)}"
-            if hasattr(e, 'response') and e.response:
-                try:
-                    error_detail = e.response.json()
-                    error_msg += f" - {error_detail.get('error', {}).get('message', 'Unknown error')}"
-                except:
-                    error_msg += f" - Status: {e.response.status_code}"
-            
-            _logger.error(error_msg)
-            raise UserError(error_msg)
+        return {
+            'success': True,
+            'space_id': result.get('name', ''),
+            'display_name': result.get('displayName', ''),
+            'type': result.get('type', ''),
+            'response': result
+        }
 
     def refresh_if_needed(self):
-        """Refresh OAuth token if expired."""
-        if self.auth_mode == 'oauth' and self.token_expiry:
-            # TODO: Check if token is expired and refresh
-            _logger.info(f"Checking token expiry for config {self.name}")
-            pass
+        """Refresh OAuth token only when it expires within the safety margin."""
+        if self.auth_mode == 'oauth':
+            self._ensure_access_token()
+
+    @api.model
+    def _cron_refresh_tokens(self):
+        """
+        Cron job to refresh OAuth tokens before they expire, so that
+        _ensure_access_token rarely has to refresh on the send path.
+        """
+        configs = self.search([
+            ('is_active', '=', True),
+            ('auth_mode', '=', 'oauth'),
+            ('refresh_token', '!=', False),
+            '|',
+            ('token_expiry', '=', False),
+            ('token_expiry', '<=', fields.Datetime.now() + CRON_REFRESH_WINDOW)
+        ])
+        
+        for config in configs:
+            try:
+                config._refresh_token()
+            except Exception as e:
+                _logger.error("Scheduled token refresh failed for config %s: %s", config.name, e)
 
     def action_test_connection(self):
         """Test Google Chat connection."""
         try:
-            # Test by listing spaces
-            spaces = self.list_spaces()
+            # One single-space page is enough to prove the credentials work
+            has_space = next(self.iter_spaces(page_size=1), None) is not None
             
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Success'),
-                    'message': _('Connection test successful. Found %d spaces.') % len(spaces),
+                    'message': _('Connection test successful.') if has_space
+                               else _('Connection test successful, but no spaces are visible to this account.'),
                     'type': 'success',
                 }
             }
         except Exception as e:
             raise UserError(_('Connection test failed: %s') % str(e))
 
+    @api.model
+    def action_test_all_connections(self):
+        """Test every active configuration concurrently and report in one notification."""
+        configs = self.search([('is_active', '=', True)])
+        now = time.monotonic()
+        failures = []
+        counts = {}
+        pending = []
+        
+        # ORM work (token refresh, session headers) stays in this thread;
+        # the workers only perform the HTTP calls
+        for config in configs:
+            entry = _SPACES_CACHE.get((self.env.cr.dbname, config.id))
+            if entry and entry[0] > now:
+                counts[config] = len(entry[1])
+                continue
+            try:
+                pending.append((config, config._authorized_session(config._api_token())))
+            except Exception as e:
+                failures.append(f"{config.name}: {e}")
+        
+        def _safe_fetch(session):
+            try:
+                return list(_iter_spaces(partial(_session_get_json, session, _SPACES_URL))), None
+            except _HTTP_ERRORS as e:
+                return None, _chat_error_message(e, "Failed to list Google Chat spaces")
+            except ValueError as e:
+                # Non-JSON body: report this config as failed, not the whole action
+                return None, f"Failed to list Google Chat spaces: invalid response ({e})"
+        
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(8, len(pending))) as executor:
+                results = list(executor.map(_safe_fetch, [session for _config, session in pending]))
+            for (config, _session), (spaces, error) in zip(pending, results):
+                if error:
+                    _logger.error(error)
+                    failures.append(f"{config.name}: {error}")
+                else:
+                    _SPACES_CACHE[(self.env.cr.dbname, config.id)] = (time.monotonic() + SPACES_CACHE_TTL, spaces)
+                    counts[config] = len(spaces)
+        
+        lines = [_('%s: %d spaces') % (config.name, count) for config, count in counts.items()] + failures
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Connection Test'),
+                'message': '; '.join(lines) or _('No active configuration found.'),
+                'type': 'danger' if failures else 'success',
+                'sticky': bool(failures),
+            }
+        }
+
     def action_list_spaces(self):
         """List available Google Chat spaces."""
         try:
@@ -529,6 +1133,19 @@ class GchatConfig(models.Model):
         except Exception as e:
             raise UserError(_('Failed to list spaces: %s') % str(e))
 
+    @api.model
+    @tools.ormcache()
+    def _oauth_redirect_uri(self):
+        """
+        OAuth redirect URI built from web.base.url, memoized per registry.
+        
+        Writing an ir.config_parameter clears the registry caches, so a
+        changed web.base.url is picked up on the next call.
+        """
+        # Lấy base URL của Odoo
+        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        return base_url.rstrip('/') + '/gchat/oauth/callback'
+
     def action_get_oauth_token(self):
         """Open OAuth flow to get tokens."""
         self.ensure_one()
@@ -536,22 +1153,17 @@ class GchatConfig(models.Model):
         if not self.oauth_client_id:
             raise UserError(_('OAuth Client ID is required. Please configure it first.'))
         
-        # Lấy base URL của Odoo
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
-        redirect_uri = base_url.rstrip('/') + '/gchat/oauth/callback'
+        redirect_uri = self._oauth_redirect_uri()
         
-        # Tạo OAuth URL
-        oauth_params = {
+        # Tạo OAuth URL; scopes entered one per line must be space-separated
+        scope = ' '.join((self.scopes or DEFAULT_SCOPES).split())
+        qs = urllib.parse.urlencode({
             'client_id': self.oauth_client_id,
             'redirect_uri': redirect_uri,
-            'response_type': 'code',
-            'scope': self.scopes or 'https://www.googleapis.com/auth/chat.messages.create https://www.googleapis.com/auth/chat.spaces.readonly',
-            'access_type': 'offline',
-            'prompt': 'consent',
+            'scope': scope,
             'state': f'config_{self.id}'
-        }
-        
-        oauth_url = 'https://accounts.google.com/o/oauth2/v2/auth?' + urllib.parse.urlencode(oauth_params)
+        })
+        oauth_url = f'{_OAUTH_BASE}&{qs}'
         
         return {
             'type': 'ir.actions.act_url',
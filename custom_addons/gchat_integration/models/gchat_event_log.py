@@ -1,9 +1,14 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
 import json
 import logging
-from datetime import datetime
+import psycopg2
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
 
 _logger = logging.getLogger(__name__)
 
@@ -29,7 +34,9 @@ class GchatEventLog(models.Model):
     thread_key = fields.Char('Thread Key', help='Thread identifier for threaded messages')
     
     # Event data
-    payload_json = fields.Text('Event Payload (JSON)', help='Full event payload from Google')
+    payload_json = fields.Json('Event Payload (JSON)', help='Full event payload from Google, stored as jsonb')
+    payload_json_pretty = fields.Text('Event Payload', compute='_compute_payload_json_pretty',
+                                      help='Indented event payload, formatted on demand for display')
     
     # Processing status
     status = fields.Selection([
@@ -48,110 +55,344 @@ class GchatEventLog(models.Model):
     message_text = fields.Text('Message Text', help='Extracted message text if applicable')
     
     # Timestamps
-    create_date = fields.Datetime('Created At', readonly=True)
+    create_date = fields.Datetime('Created At', readonly=True, index=True)
     write_date = fields.Datetime('Updated At', readonly=True)
     
     _sql_constraints = [
-        ('unique_external_event_id', 'unique(external_event_id)', 
-         'External event ID must be unique.'),
+        ('unique_external_event_id', 'unique(external_event_id, source)', 
+         'External event ID must be unique per source.'),
     ]
 
-    def process_incoming(self, envelope, event_json):
+    @api.depends('payload_json')
+    def _compute_payload_json_pretty(self):
+        """Indent the stored payload for display only."""
+        for event in self:
+            payload = event.payload_json
+            if not payload:
+                event.payload_json_pretty = False
+                continue
+            if orjson:
+                event.payload_json_pretty = orjson.dumps(payload, option=orjson.OPT_INDENT_2).decode()
+            else:
+                event.payload_json_pretty = json.dumps(payload, indent=2)
+
+    def process_incoming(self, envelope, event_json, batch=None):
         """
         Process incoming event from Google Chat.
         
         Args:
             envelope (dict): Pub/Sub envelope with message_id, publish_time, etc.
-            event_json (dict): Decoded event data from Google Chat
+            event_json (dict|bytes|str): Event data from Google Chat, either
+                already decoded or as raw JSON
+            batch (dict): Shared state from process_incoming_batch (prefetched
+                users/threads, deferred chatter messages); None for single events
             
         Returns:
             bool: True if processed successfully
         """
         self.ensure_one()
+        pending_mark = len(batch['messages']) if batch is not None else 0
+        # One UTC timestamp per event, or per batch when called from process_incoming_batch
+        now = batch['now'] if batch is not None else fields.Datetime.now()
+        # Extracted fields are collected here and written once with the final status
+        vals = {}
         
         try:
             # Check for duplicate processing
             if self.status in ['done', 'processing']:
-                _logger.info(f"Event {self.external_event_id} already processed, skipping")
+                _logger.info("Event %s already processed, skipping", self.external_event_id)
                 return True
             
-            # Mark as processing
-            self.write({'status': 'processing'})
+            # Mark as processing for concurrent workers, without an ORM write
+            self.env.cr.execute(
+                "UPDATE gchat_event_log SET status = 'processing' WHERE id = %s", (self.id,)
+            )
+            self.invalidate_recordset(['status'])
+            
+            # Parse raw payloads only now that we know the event is processed
+            if isinstance(event_json, (bytes, str)):
+                event_json = self._parse_payload(event_json)
             
             # Extract basic event info
             event_type = event_json.get('eventType', 'UNKNOWN')
-            space_name = event_json.get('space', {}).get('name', '')
-            thread_name = event_json.get('thread', {}).get('name', '')
-            user_email = event_json.get('user', {}).get('email', '')
-            
-            # Update event with extracted info
-            self.write({
+            space_name = (event_json.get('space') or {}).get('name', '')
+            thread_name = (event_json.get('thread') or {}).get('name', '')
+            vals.update({
                 'event_type': event_type,
-                'user_email': user_email,
+                'user_email': (event_json.get('user') or {}).get('email', ''),
                 'message_text': self._extract_message_text(event_json)
             })
             
             # Find related space and thread
-            space = self._find_space(space_name)
-            thread = self._find_thread(space, thread_name) if space else None
+            space = self._find_space(space_name, batch)
+            thread = self._find_thread(space, thread_name, batch) if space else None
             
             if space:
-                self.space_id = space.id
+                vals['space_id'] = space.id
             if thread:
-                self.thread_key = thread.thread_key
+                vals['thread_key'] = thread.thread_key
             
             # Route event based on type
             if event_type == 'MESSAGE_CREATED':
-                self._process_message_created(event_json)
+                self._process_message_created(event_json, vals, batch)
             elif event_type == 'MESSAGE_UPDATED':
-                self._process_message_updated(event_json)
+                self._process_message_updated(event_json, vals, batch)
             elif event_type == 'MEMBER_ADDED':
-                self._process_member_added(event_json)
+                self._process_member_added(event_json, vals, now)
             elif event_type == 'MEMBER_REMOVED':
-                self._process_member_removed(event_json)
+                self._process_member_removed(event_json, vals, now)
             else:
-                _logger.info(f"Unhandled event type: {event_type}")
-                self.write({'status': 'skipped'})
+                _logger.info("Unhandled event type: %s", event_type)
+                vals['status'] = 'skipped'
+                self.write(vals)
                 return True
             
             # Mark as processed
-            self.write({
+            vals.update({
                 'status': 'done',
-                'processed_at': datetime.now()
+                'processed_at': now
             })
+            self.write(vals)
             
             return True
             
         except Exception as e:
             error_msg = str(e)
-            _logger.error(f"Failed to process event {self.external_event_id}: {error_msg}")
+            _logger.error("Failed to process event %s: %s", self.external_event_id, error_msg)
+            
+            # Drop chatter messages this event queued before failing
+            if batch is not None:
+                del batch['messages'][pending_mark:]
             
-            self.write({
+            vals.update({
                 'status': 'error',
                 'error': error_msg,
-                'processed_at': datetime.now()
+                'processed_at': now
             })
+            self.write(vals)
             
             return False
 
-    def _find_space(self, space_name):
-        """Find space record by Google Chat space name."""
+    @api.model
+    def ingest(self, vals_list):
+        """
+        Insert event logs, atomically skipping ones that already exist.
+        
+        Uses INSERT ... ON CONFLICT DO NOTHING on the (external_event_id, source)
+        unique key, so concurrent deliveries of the same Pub/Sub message cannot
+        race between a lookup and the insert. If PostgreSQL refuses a payload
+        as jsonb, rows are retried one by one and only that payload is kept
+        as a JSON string.
+        
+        Args:
+            vals_list (list): Dicts with external_event_id, event_type and
+                optionally source, payload_json (raw JSON text, cast to jsonb
+                by PostgreSQL, or a decoded dict) and status
+            
+        Returns:
+            recordset: The logs actually created; duplicates are left out
+        """
+        if not vals_list:
+            return self.browse()
+        
+        rows = []
+        for vals in vals_list:
+            payload = vals.get('payload_json')
+            if isinstance(payload, (dict, list)):
+                payload = json.dumps(payload)
+            rows.append((
+                vals['external_event_id'],
+                vals.get('source', 'chat'),
+                vals['event_type'],
+                payload,
+                vals.get('status', 'new'),
+            ))
+        
+        try:
+            with self.env.cr.savepoint():
+                log_ids = self._insert_logs(rows)
+        except psycopg2.DataError as e:
+            # One payload refused by jsonb (e.g. \u0000) must not fail the
+            # whole batch: retry one row at a time
+            _logger.warning("Batch event log insert failed, retrying per event: %s", e)
+            log_ids = []
+            for row in rows:
+                try:
+                    with self.env.cr.savepoint():
+                        log_ids += self._insert_logs([row])
+                except psycopg2.DataError as e:
+                    _logger.error("Payload of event %s refused as jsonb, storing it as a JSON string: %s", row[0], e)
+                    log_ids += self._insert_logs([row], payload_sql='to_jsonb(%s::text)')
+        return self.browse(log_ids)
+
+    def _insert_logs(self, rows, payload_sql='%s::jsonb'):
+        """
+        Insert event log rows with one INSERT ... ON CONFLICT DO NOTHING.
+        
+        Args:
+            rows (list): (external_event_id, source, event_type, payload, status) tuples
+            payload_sql (str): SQL expression turning the payload parameter into jsonb
+            
+        Returns:
+            list: Ids of the rows actually inserted
+        """
+        row_sql = f"(%s, %s, %s, {payload_sql}, %s, %s, %s, now() at time zone 'UTC', now() at time zone 'UTC')"
+        params = [value for row in rows for value in (*row, self.env.uid, self.env.uid)]
+        self.env.cr.execute(f"""
+            INSERT INTO gchat_event_log
+                (external_event_id, source, event_type, payload_json, status,
+                 create_uid, write_uid, create_date, write_date)
+            VALUES {', '.join([row_sql] * len(rows))}
+            ON CONFLICT (external_event_id, source) DO NOTHING
+            RETURNING id
+        """, params)
+        return [log_id for log_id, in self.env.cr.fetchall()]
+
+    @api.model
+    def process_incoming_batch(self, items):
+        """
+        Process several incoming events, batching lookups and chatter writes.
+        
+        Spaces, threads and message authors of all events are fetched with
+        one search each, and the resulting mail.message rows are created in
+        one call.
+        
+        Args:
+            items (list): (event_log, envelope, event_json) tuples
+            
+        Returns:
+            list: bool success per item, in input order
+        """
+        parsed = []
+        emails = set()
+        space_names = set()
+        thread_keys = set()
+        for event_log, envelope, event_json in items:
+            if isinstance(event_json, (bytes, str)):
+                try:
+                    event_json = self._parse_payload(event_json)
+                except ValueError:
+                    # Leave it raw; process_incoming records the parse error
+                    parsed.append((event_log, envelope, event_json))
+                    continue
+            space_name = (event_json.get('space') or {}).get('name')
+            thread_name = (event_json.get('thread') or {}).get('name')
+            if space_name:
+                space_names.add(space_name)
+            if thread_name:
+                thread_keys.add(thread_name.split('/')[-1])
+            if event_json.get('eventType') in ('MESSAGE_CREATED', 'MESSAGE_UPDATED'):
+                email = (event_json.get('user') or {}).get('email')
+                if email:
+                    emails.add(email)
+            parsed.append((event_log, envelope, event_json))
+        
+        batch = {
+            'users': {},
+            'spaces': {},
+            'threads': {},
+            'space_threads': {},
+            'messages': [],
+            'now': fields.Datetime.now(),
+        }
+        if emails:
+            for user in self.env['res.users'].search([('email', 'in', list(emails))]):
+                batch['users'].setdefault(user.email, user)
+        if space_names:
+            for space in self.env['gchat.space'].search([
+                ('space_id', 'in', list(space_names)),
+                ('active', '=', True)
+            ]):
+                batch['spaces'].setdefault(space.space_id, space)
+        if thread_keys:
+            for thread in self.env['gchat.thread'].search([
+                ('thread_key', 'in', list(thread_keys)),
+                ('active', '=', True)
+            ]):
+                batch['threads'].setdefault(thread.thread_key, thread)
+                batch['space_threads'].setdefault((thread.space_id.id, thread.thread_key), thread)
+        
+        results = []
+        for event_log, envelope, event_json in parsed:
+            try:
+                # Isolate each event so one failure does not abort the batch
+                with self.env.cr.savepoint():
+                    results.append(event_log.process_incoming(envelope, event_json, batch))
+            except Exception as e:
+                _logger.error("Unexpected error processing event %s: %s", event_log.external_event_id, e)
+                results.append(False)
+        
+        failed = self._create_batch_messages(batch['messages'])
+        if failed:
+            results = [
+                success and event_log.id not in failed
+                for success, (event_log, _envelope, _event) in zip(results, parsed)
+            ]
+        return results
+
+    @api.model
+    def _create_batch_messages(self, pending):
+        """
+        Create the chatter messages queued by a batch in one multi-create.
+        
+        Args:
+            pending (list): (event_log, mail.message values) tuples
+            
+        Returns:
+            set: Ids of the event logs whose message could not be created
+        """
+        failed = set()
+        if not pending:
+            return failed
+        try:
+            with self.env.cr.savepoint():
+                self.env['mail.message'].create([vals for _event_log, vals in pending])
+            return failed
+        except Exception as e:
+            _logger.warning("Batch chatter insert failed, retrying per message: %s", e)
+        
+        # Fall back to one insert per message so only the faulty events are marked failed
+        for event_log, vals in pending:
+            try:
+                with self.env.cr.savepoint():
+                    self.env['mail.message'].create(vals)
+            except Exception as e:
+                _logger.error("Failed to post chat message for event %s: %s", event_log.external_event_id, e)
+                event_log.write({'status': 'error', 'error': str(e)})
+                failed.add(event_log.id)
+        return failed
+
+    @api.model
+    def _parse_payload(self, raw):
+        """Parse a raw JSON payload (bytes or str) into a dict."""
+        if orjson:
+            return orjson.loads(raw)
+        return json.loads(raw)
+
+    def _find_space(self, space_name, batch=None):
+        """Find space record by Google Chat space name (from the batch prefetch if given)."""
         if not space_name:
             return False
+        
+        if batch is not None:
+            return batch['spaces'].get(space_name, False)
             
         return self.env['gchat.space'].search([
             ('space_id', '=', space_name),
             ('active', '=', True)
         ], limit=1)
 
-    def _find_thread(self, space, thread_name):
-        """Find thread record by Google Chat thread name."""
+    def _find_thread(self, space, thread_name, batch=None):
+        """Find thread record by Google Chat thread name (from the batch prefetch if given)."""
         if not space or not thread_name:
             return False
             
         # Extract thread key from full name
         thread_key = thread_name.split('/')[-1] if '/' in thread_name else thread_name
         
+        if batch is not None:
+            return batch['space_threads'].get((space.id, thread_key), False)
+        
         return self.env['gchat.thread'].search([
             ('space_id', '=', space.id),
             ('thread_key', '=', thread_key),
@@ -160,24 +401,43 @@ class GchatEventLog(models.Model):
 
     def _extract_message_text(self, event_json):
         """Extract message text from event JSON."""
-        message = event_json.get('message', {})
-        if message.get('text'):
-            return message['text']
-        elif message.get('cards'):
-            for card in message['cards']:
-                if card.get('header', {}).get('title'):
-                    return card['header']['title']
+        message = event_json.get('message') or {}
+        text = message.get('text')
+        if text:
+            return text
+        # Only card-only messages fall through to the card headers
+        for card in message.get('cards') or ():
+            title = (card.get('header') or {}).get('title')
+            if title:
+                return title
         return ''
 
-    def _process_message_created(self, event_json):
-        """Process MESSAGE_CREATED event."""
-        if not self.thread_key:
+    @api.model
+    @tools.ormcache()
+    def _mt_comment_id(self):
+        """Id of the mail.mt_comment subtype, resolved once per registry."""
+        return self.env.ref('mail.mt_comment').id
+
+    def _process_message_created(self, event_json, vals, batch=None):
+        """
+        Process MESSAGE_CREATED event.
+        
+        Args:
+            event_json (dict): Parsed event
+            vals (dict): Fields extracted by process_incoming, not yet written
+            batch (dict): Shared process_incoming_batch state, if any
+        """
+        thread_key = vals.get('thread_key')
+        if not thread_key:
             return
         
-        thread = self.env['gchat.thread'].search([
-            ('thread_key', '=', self.thread_key),
-            ('active', '=', True)
-        ], limit=1)
+        if batch is not None:
+            thread = batch['threads'].get(thread_key)
+        else:
+            thread = self.env['gchat.thread'].search([
+                ('thread_key', '=', thread_key),
+                ('active', '=', True)
+            ], limit=1)
         
         if not thread:
             return
@@ -185,42 +445,54 @@ class GchatEventLog(models.Model):
         task = thread.task_id
         
         # Create mail.message in task chatter
-        if self.message_text and self.user_email:
-            user = self.env['res.users'].search([
-                ('email', '=', self.user_email)
-            ], limit=1)
+        message_text = vals.get('message_text')
+        user_email = vals.get('user_email')
+        if message_text and user_email:
+            if batch is not None:
+                user = batch['users'].get(user_email)
+            else:
+                user = self.env['res.users'].search([
+                    ('email', '=', user_email)
+                ], limit=1)
             
-            self.env['mail.message'].create({
+            message_vals = {
                 'model': 'project.task',
                 'res_id': task.id,
                 'message_type': 'comment',
-                'subtype_id': self.env.ref('mail.mt_comment').id,
-                'body': f"<p><strong>Google Chat message from {self.user_email}:</strong></p><p>{self.message_text}</p>",
+                'subtype_id': self._mt_comment_id(),
+                'body': f"<p><strong>Google Chat message from {user_email}:</strong></p><p>{message_text}</p>",
                 'author_id': user.partner_id.id if user else False,
-                'email_from': self.user_email,
-            })
+                'email_from': user_email,
+            }
+            if batch is not None:
+                batch['messages'].append((self, message_vals))
+            else:
+                self.env['mail.message'].create(message_vals)
 
-    def _process_message_updated(self, event_json):
+    def _process_message_updated(self, event_json, vals, batch=None):
         """Process MESSAGE_UPDATED event."""
-        self._process_message_created(event_json)
+        self._process_message_created(event_json, vals, batch)
 
-    def _process_member_added(self, event_json):
+    def _process_member_added(self, event_json, vals, now):
         """Process MEMBER_ADDED event."""
-        if not self.space_id:
+        space_id = vals.get('space_id')
+        if not space_id:
             return
         
         member_info = event_json.get('member', {})
         email = member_info.get('email', '')
         
         if email:
+            # Removed memberships are kept as history; only the live one counts
             member = self.env['gchat.member'].search([
-                ('space_id', '=', self.space_id.id),
-                ('email', '=', email)
+                ('space_id', '=', space_id),
+                ('email', '=', email),
+                ('state', '!=', 'removed')
             ], limit=1)
             
             if not member:
                 self.env['gchat.member'].create({
-                    'space_id': self.space_id.id,
+                    'space_id': space_id,
                     'email': email,
                     'google_user_id': member_info.get('name', '').split('/')[-1],
                     'role': member_info.get('role', 'MEMBER'),
@@ -230,27 +502,30 @@ class GchatEventLog(models.Model):
                 member.write({
                     'role': member_info.get('role', 'MEMBER'),
                     'state': 'active',
-                    'last_sync': datetime.now()
+                    'last_sync': now
                 })
 
-    def _process_member_removed(self, event_json):
+    def _process_member_removed(self, event_json, vals, now):
         """Process MEMBER_REMOVED event."""
-        if not self.space_id:
+        space_id = vals.get('space_id')
+        if not space_id:
             return
         
         member_info = event_json.get('member', {})
         email = member_info.get('email', '')
         
         if email:
+            # Removed memberships are kept as history; only the live one counts
             member = self.env['gchat.member'].search([
-                ('space_id', '=', self.space_id.id),
-                ('email', '=', email)
+                ('space_id', '=', space_id),
+                ('email', '=', email),
+                ('state', '!=', 'removed')
             ], limit=1)
             
             if member:
                 member.write({
                     'state': 'removed',
-                    'last_sync': datetime.now()
+                    'last_sync': now
                 })
 
     def action_retry_processing(self):
@@ -260,7 +535,7 @@ class GchatEventLog(models.Model):
         if self.status == 'error':
             self.write({'status': 'new'})
             envelope = {'message_id': self.external_event_id}
-            event_json = json.loads(self.payload_json) if self.payload_json else {}
-            return self.process_incoming(envelope, event_json)
+            # jsonb payload is read back already decoded
+            return self.process_incoming(envelope, self.payload_json or {})
         
         return False 
\ No newline at end of file
@@ -1,7 +1,10 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.osv import expression
+from odoo.tools import groupby
 import logging
+from collections import defaultdict
 
 _logger = logging.getLogger(__name__)
 
@@ -17,7 +20,8 @@ class GchatMember(models.Model):
     # Google Chat user info
     email = fields.Char('Email', required=True)
     google_user_id = fields.Char('Google User ID')
-    display_name = fields.Char('Display Name', compute='_compute_display_name', store=True)
+    display_name = fields.Char('Display Name', compute='_compute_display_name',
+                               search='_search_display_name')
     
     # Member details
     role = fields.Selection([
@@ -46,86 +50,208 @@ class GchatMember(models.Model):
     avatar_url = fields.Char('Avatar URL')
     is_bot = fields.Boolean('Is Bot', default=False)
     
-    _sql_constraints = [
-        ('unique_space_email', 'unique(space_id, email)', 
-         'Email must be unique per space.'),
-    ]
 
+    # Not stored: computed on read for the displayed rows only, so a partner
+    # rename merely invalidates the cache instead of rewriting member rows
     @api.depends('partner_id.name', 'email', 'google_user_id')
     def _compute_display_name(self):
         """Compute display name for the member."""
         for member in self:
-            if member.partner_id:
-                member.display_name = f"{member.partner_id.name} ({member.email})"
+            # Fetch only the name column, still in one query for all partners
+            partner = member.partner_id.with_context(prefetch_fields=False)
+            if partner:
+                member.display_name = f"{partner.name} ({member.email})"
             elif member.google_user_id:
                 member.display_name = f"{member.google_user_id} ({member.email})"
             else:
                 member.display_name = member.email
 
+    def _search_display_name(self, operator, value):
+        """Search on the fields display_name is built from."""
+        domains = [[(fname, operator, value)] for fname in ('email', 'partner_id.name', 'google_user_id')]
+        if operator in expression.NEGATIVE_TERM_OPERATORS:
+            return expression.AND(domains)
+        return expression.OR(domains)
+
+    def _auto_init(self):
+        res = super()._auto_init()
+        # display_name used to be stored; drop the leftover column
+        self.env.cr.execute("ALTER TABLE gchat_member DROP COLUMN IF EXISTS display_name")
+        # Email must be unique per space among live members only; removed
+        # rows are kept as history and the email can be invited again
+        self.env.cr.execute("ALTER TABLE gchat_member DROP CONSTRAINT IF EXISTS gchat_member_unique_space_email")
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS gchat_member_unique_space_email_live
+            ON gchat_member (space_id, email) WHERE state != 'removed'
+        """)
+        return res
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # The partial unique index rejects duplicates at INSERT time, before
+        # constraints run; check first to raise the user-facing message
+        keys = [
+            (vals.get('space_id'), vals.get('email'))
+            for vals in vals_list if vals.get('state', 'active') != 'removed'
+        ]
+        if len(set(keys)) < len(keys) or self._live_member_exists(keys):
+            raise ValidationError(_('Email must be unique per space.'))
+        return super().create(vals_list)
+
+    @api.constrains('space_id', 'email', 'state')
+    def _check_unique_space_email(self):
+        """Ensure an email is a live member of a space only once."""
+        # Checked from the cache before the write is flushed, so the partial
+        # unique index never surfaces as a raw IntegrityError; removed
+        # members are history and do not count
+        live = self.filtered(lambda m: m.state != 'removed')
+        keys = [(member.space_id.id, member.email) for member in live]
+        if len(set(keys)) < len(keys) or self._live_member_exists(keys, live.ids):
+            raise ValidationError(_('Email must be unique per space.'))
+
+    @api.model
+    def _live_member_exists(self, keys, exclude_ids=None):
+        """
+        Check whether other live members already use some (space, email) pairs.
+        
+        Args:
+            keys (list): (space id, email) tuples
+            exclude_ids (list): Member ids to leave out, e.g. the ones being written
+            
+        Returns:
+            bool: True if one of the pairs is taken
+        """
+        if not keys:
+            return False
+        self.env.cr.execute("""
+            SELECT 1 FROM gchat_member
+             WHERE (space_id, email) IN %s AND state != 'removed' AND id NOT IN %s
+             LIMIT 1
+        """, [tuple(keys), tuple(exclude_ids or [0])])
+        return bool(self.env.cr.fetchone())
+
     @api.constrains('space_id', 'partner_id')
     def _check_company_consistency(self):
         """Ensure space and partner belong to same company."""
-        for member in self:
-            if member.partner_id and member.space_id.project_id.company_id != member.partner_id.company_id:
-                raise ValidationError(_('Space and partner must belong to the same company.'))
+        # One query for the whole recordset instead of walking
+        # space -> project -> company per member
+        self.flush_recordset(['space_id', 'partner_id'])
+        self.env['gchat.space'].flush_model(['project_id'])
+        self.env['project.project'].flush_model(['company_id'])
+        self.env['res.partner'].flush_model(['company_id'])
+        self.env.cr.execute("""
+            SELECT m.id
+              FROM gchat_member m
+              JOIN gchat_space s ON s.id = m.space_id
+              JOIN project_project p ON p.id = s.project_id
+              JOIN res_partner rp ON rp.id = m.partner_id
+             WHERE m.id IN %s
+               AND p.company_id IS DISTINCT FROM rp.company_id
+             LIMIT 1
+        """, [tuple(self.ids)])
+        if self.env.cr.fetchone():
+            raise ValidationError(_('Space and partner must belong to the same company.'))
 
     def invite(self):
         """
-        Invite member to Google Chat space.
+        Invite members to their Google Chat spaces, one API call per space.
+        
+        Successful members are then updated with a single write.
         
         Returns:
-            bool: True if successful
+            bool: True if all members were invited
         """
-        self.ensure_one()
+        invited = self.browse()
+        failed = self.browse()
         
-        try:
-            # TODO: Implement Google Chat API call to invite member
-            # - Use space.config_id.get_client() to get authenticated client
-            # - Call Chat API to invite user to space
-            _logger.info(f"Inviting {self.email} to space {self.space_id.space_id}")
-            
-            # Mock implementation
-            self.write({
+        for space, members in groupby(self, key=lambda m: m.space_id):
+            members = self.concat(*members)
+            try:
+                # TODO: Implement Google Chat API call to invite members
+                # - Use space.config_id.get_client() to get authenticated client
+                # - Create all memberships of this space in one batch request
+                _logger.info("Inviting %s to space %s", ', '.join(members.mapped('email')), space.space_id)
+                
+                # Mock implementation
+                invited |= members
+                
+            except Exception as e:
+                failed |= members
+                _logger.error("Failed to invite members to space %s: %s", space.space_id, e)
+        
+        if invited:
+            invited.write({
                 'state': 'invited',
                 'last_sync': fields.Datetime.now()
             })
-            
-            return True
-            
-        except Exception as e:
-            self.write({
-                'state': 'error',
-                'sync_status': 'error'
-            })
-            _logger.error(f"Failed to invite member: {str(e)}")
-            return False
+        if failed:
+            failed.write({'sync_status': 'error'})
+        
+        return not failed
 
     def remove(self):
         """
-        Remove member from Google Chat space.
+        Remove members from their Google Chat spaces, one API call per space.
+        
+        Successful members are then updated with a single write.
         
         Returns:
-            bool: True if successful
+            bool: True if all members were removed
         """
-        self.ensure_one()
+        removed = self.browse()
+        failed = self.browse()
         
-        try:
-            # TODO: Implement Google Chat API call to remove member
-            # - Use space.config_id.get_client() to get authenticated client
-            # - Call Chat API to remove user from space
-            _logger.info(f"Removing {self.email} from space {self.space_id.space_id}")
-            
-            # Mock implementation
-            self.write({
+        for space, members in groupby(self, key=lambda m: m.space_id):
+            members = self.concat(*members)
+            try:
+                # TODO: Implement Google Chat API call to remove members
+                # - Use space.config_id.get_client() to get authenticated client
+                # - Delete all memberships of this space in one batch request
+                _logger.info("Removing %s from space %s", ', '.join(members.mapped('email')), space.space_id)
+                
+                # Mock implementation
+                removed |= members
+                
+            except Exception as e:
+                failed |= members
+                _logger.error("Failed to remove members from space %s: %s", space.space_id, e)
+        
+        if removed:
+            removed.write({
                 'state': 'removed',
                 'last_sync': fields.Datetime.now()
             })
-            
-            return True
-            
-        except Exception as e:
-            _logger.error(f"Failed to remove member: {str(e)}")
-            return False
+        
+        return not failed
+
+    def resolve_partners(self):
+        """
+        Find and link Odoo partners based on email, for the whole recordset.
+        
+        Partners are looked up with one query and linked with one write per
+        partner.
+        
+        Returns:
+            res.partner: Partners that were found
+        """
+        emails = list({member.email for member in self if member.email})
+        if not emails:
+            return self.env['res.partner']
+        
+        # First partner per email, in default order like search(limit=1)
+        mapping = {}
+        for row in self.env['res.partner'].search_read([('email', 'in', emails)], ['email']):
+            mapping.setdefault(row['email'], row['id'])
+        
+        members_by_partner = defaultdict(list)
+        for member in self:
+            partner_id = mapping.get(member.email)
+            if partner_id and member.partner_id.id != partner_id:
+                members_by_partner[partner_id].append(member.id)
+        for partner_id, member_ids in members_by_partner.items():
+            self.browse(member_ids).write({'partner_id': partner_id})
+        
+        return self.env['res.partner'].browse(list(set(mapping.values())))
 
     def resolve_partner(self):
         """
@@ -135,32 +261,17 @@ class GchatMember(models.Model):
             res.partner: Found partner or False
         """
         self.ensure_one()
-        
-        if not self.email:
-            return False
-            
-        # Try to find partner by email
-        partner = self.env['res.partner'].search([
-            ('email', '=', self.email)
-        ], limit=1)
-        
-        if partner:
-            self.partner_id = partner.id
-            return partner
-            
-        return False
+        return self.resolve_partners() or False
 
     def action_invite(self):
-        """Action to invite member."""
-        self.ensure_one()
-        
+        """Action to invite the selected members."""
         if self.invite():
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Success'),
-                    'message': _('Member invited successfully'),
+                    'message': _('%s member(s) invited successfully') % len(self),
                     'type': 'success',
                 }
             }
@@ -168,16 +279,14 @@ class GchatMember(models.Model):
             raise UserError(_('Failed to invite member'))
 
     def action_remove(self):
-        """Action to remove member."""
-        self.ensure_one()
-        
+        """Action to remove the selected members."""
         if self.remove():
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Success'),
-                    'message': _('Member removed successfully'),
+                    'message': _('%s member(s) removed successfully') % len(self),
                     'type': 'success',
                 }
             }
@@ -210,34 +319,123 @@ class GchatMember(models.Model):
                 }
             }
 
+    def _touch_last_sync(self, now=None):
+        """
+        Stamp last_sync with a single UPDATE, bypassing the ORM write.
+        
+        last_sync is audit-only (nothing depends on it), so the full write
+        path is not needed when it is the only column changing.
+        
+        Args:
+            now (datetime): Timestamp to set, defaults to now
+        """
+        if not self:
+            return
+        self.flush_recordset(['last_sync'])
+        self.env.cr.execute(
+            f"UPDATE {self._table} SET last_sync = %s WHERE id IN %s",
+            [now or fields.Datetime.now(), tuple(self.ids)]
+        )
+        self.invalidate_recordset(['last_sync'])
+
+    def _fetch_space_members(self, space):
+        """
+        Fetch the members of one space from Google Chat.
+        
+        Args:
+            space: gchat.space record
+            
+        Returns:
+            list: Dicts with email, google_user_id, role, avatar_url and is_bot
+        """
+        # TODO: Implement member fetch from Google Chat API
+        # - Use space.config_id.get_client() to get authenticated client
+        # - One spaces.members.list call (per page) for the space
+        _logger.info("Fetching members for space %s", space.space_id)
+        
+        # Mock implementation
+        return []
+
+    @api.model
+    def sync_spaces(self, spaces):
+        """
+        Sync members of several Google Chat spaces in one pass.
+        
+        Remote members of all spaces are merged first, then new members are
+        created with one multi-create and changed ones updated with one
+        write per distinct set of values. Unchanged members only get their
+        last_sync stamped.
+        
+        Args:
+            spaces: gchat.space recordset
+            
+        Returns:
+            dict: Number of 'created' and 'updated' members
+        """
+        remote = {}
+        for space in spaces:
+            for info in self._fetch_space_members(space):
+                if info.get('email'):
+                    remote[(space.id, info['email'])] = info
+        
+        existing = {
+            (member.space_id.id, member.email): member
+            for member in self.search([('space_id', 'in', spaces.ids), ('state', '!=', 'removed')])
+        }
+        
+        to_create = []
+        to_update = defaultdict(list)
+        unchanged = []
+        for (space_id, email), info in remote.items():
+            vals = {
+                'google_user_id': info.get('google_user_id') or False,
+                'role': info.get('role') or 'MEMBER',
+                'avatar_url': info.get('avatar_url') or False,
+                'is_bot': bool(info.get('is_bot')),
+                'state': 'active',
+            }
+            member = existing.get((space_id, email))
+            if not member:
+                to_create.append(dict(vals, space_id=space_id, email=email))
+            elif all(member[fname] == value for fname, value in vals.items()):
+                unchanged.append(member.id)
+            else:
+                to_update[tuple(sorted(vals.items()))].append(member.id)
+        
+        now = fields.Datetime.now()
+        if to_create:
+            self.create([dict(vals, last_sync=now) for vals in to_create])
+        for vals, member_ids in to_update.items():
+            self.browse(member_ids).write(dict(vals, last_sync=now))
+        self.browse(unchanged)._touch_last_sync(now)
+        
+        return {
+            'created': len(to_create),
+            'updated': sum(len(member_ids) for member_ids in to_update.values()),
+        }
+
     @api.model
     def sync_space_members(self, space):
         """
         Sync members from Google Chat space.
         
         Args:
-            space: gchat.space record
+            space: gchat.space record(s)
             
         Returns:
             dict: Sync result
         """
         try:
-            # TODO: Implement member sync from Google Chat API
-            # - Get space members from Chat API
-            # - Create/update gchat.member records
-            # - Link with existing partners
-            _logger.info(f"Syncing members for space {space.space_id}")
-            
-            # Mock implementation
+            result = self.sync_spaces(space)
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Success'),
-                    'message': _('Members synced successfully'),
+                    'message': _('Members synced successfully (%(created)s created, %(updated)s updated)') % result,
                     'type': 'success',
                 }
             }
             
         except Exception as e:
-            raise UserError(_('Failed to sync members: %s') % str(e)) 
\ No newline at end of file
+            raise UserError(_('Failed to sync members: %s') % str(e))
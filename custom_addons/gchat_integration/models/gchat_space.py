@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.osv import expression
 import logging
 
 _logger = logging.getLogger(__name__)
@@ -14,7 +15,8 @@ class GchatSpace(models.Model):
     project_id = fields.Many2one('project.project', string='Project', required=True, ondelete='cascade')
     space_id = fields.Char('Google Chat Space ID', required=True, 
                           help='Google Chat space identifier')
-    display_name = fields.Char('Space Name', compute='_compute_display_name', store=True)
+    display_name = fields.Char('Space Name', compute='_compute_display_name',
+                               search='_search_display_name')
     
     config_id = fields.Many2one('gchat.config', string='Configuration', required=True)
     active = fields.Boolean('Active', default=True)
@@ -45,21 +47,49 @@ class GchatSpace(models.Model):
          'Space ID must be unique across all projects.')
     ]
 
+    # Not stored, like gchat.member: computed on read for the displayed rows only
     @api.depends('project_id.name', 'space_display_name', 'space_id')
     def _compute_display_name(self):
         """Compute display name for the space."""
         for space in self:
+            # Fetch only the name column, still in one query for all projects
+            project_name = space.project_id.with_context(prefetch_fields=False).name
             if space.space_display_name:
-                space.display_name = f"{space.project_id.name} - {space.space_display_name}"
+                space.display_name = f"{project_name} - {space.space_display_name}"
             else:
-                space.display_name = f"{space.project_id.name} - {space.space_id}"
+                space.display_name = f"{project_name} - {space.space_id}"
+
+    def _search_display_name(self, operator, value):
+        """Search on the fields display_name is built from."""
+        domains = [[(fname, operator, value)] for fname in ('project_id.name', 'space_display_name', 'space_id')]
+        if operator in expression.NEGATIVE_TERM_OPERATORS:
+            return expression.AND(domains)
+        return expression.OR(domains)
+
+    def _auto_init(self):
+        res = super()._auto_init()
+        # display_name used to be stored; drop the leftover column
+        self.env.cr.execute("ALTER TABLE gchat_space DROP COLUMN IF EXISTS display_name")
+        return res
 
     @api.constrains('config_id', 'project_id')
     def _check_company_consistency(self):
         """Ensure config and project belong to same company."""
-        for space in self:
-            if space.config_id.company_id != space.project_id.company_id:
-                raise ValidationError(_('Configuration and project must belong to the same company.'))
+        # One query for the whole recordset instead of per-space lookups
+        self.flush_recordset(['config_id', 'project_id'])
+        self.env['gchat.config'].flush_model(['company_id'])
+        self.env['project.project'].flush_model(['company_id'])
+        self.env.cr.execute("""
+            SELECT s.id
+              FROM gchat_space s
+              JOIN gchat_config c ON c.id = s.config_id
+              JOIN project_project p ON p.id = s.project_id
+             WHERE s.id IN %s
+               AND c.company_id IS DISTINCT FROM p.company_id
+             LIMIT 1
+        """, [tuple(self.ids)])
+        if self.env.cr.fetchone():
+            raise ValidationError(_('Configuration and project must belong to the same company.'))
 
     def action_create_space(self):
         """
@@ -137,62 +167,68 @@ class GchatSpace(models.Model):
             gchat.subscription: Subscription record
         """
         self.ensure_one()
-        
-        if not self.subscription_id:
-            # TODO: Create subscription via Google Cloud Pub/Sub API
-            _logger.info(f"Creating subscription for space {self.space_id}")
-            
-            # Mock implementation
-            subscription = self.env['gchat.subscription'].create({
-                'config_id': self.config_id.id,
-                'space_id': self.id,
-                'topic': f'projects/{self.config_id.company_id.id}/topics/gchat-events',
-                'subscription_name': f'gchat-sub-{self.space_id.replace("spaces/", "")}',
-                'mode': 'pull',
-                'status': 'active'
-            })
-            
-            self.subscription_id = subscription.id
-            
+        self.ensure_subscriptions()
         return self.subscription_id
 
+    def ensure_subscriptions(self):
+        """
+        Ensure Pub/Sub subscriptions exist for all spaces in the recordset.
+        
+        Missing subscriptions are created with one multi-create and linked
+        back with one UPDATE.
+        
+        Returns:
+            gchat.subscription: Subscriptions that were created
+        """
+        missing = self.filtered(lambda s: not s.subscription_id)
+        if not missing:
+            return self.env['gchat.subscription']
+        
+        # TODO: Create subscriptions via Google Cloud Pub/Sub API
+        _logger.info("Creating subscriptions for spaces %s", ', '.join(missing.mapped('space_id')))
+        
+        # Mock implementation
+        subscriptions = self.env['gchat.subscription'].create([{
+            'config_id': space.config_id.id,
+            'space_id': space.id,
+            'topic': f'projects/{space.config_id.company_id.id}/topics/gchat-events',
+            'subscription_name': f'gchat-sub-{space.space_id.replace("spaces/", "")}',
+            'mode': 'pull',
+            'status': 'active'
+        } for space in missing])
+        
+        # Each space gets a different value, which the ORM would flush as
+        # one UPDATE per space; link them all in a single statement instead
+        missing.flush_recordset(['subscription_id'])
+        self.env.cr.execute(f"""
+            UPDATE gchat_space s
+               SET subscription_id = v.subscription_id,
+                   write_uid = %s,
+                   write_date = now() at time zone 'UTC'
+              FROM (VALUES {', '.join(['(%s, %s)'] * len(missing))}) AS v(space_id, subscription_id)
+             WHERE s.id = v.space_id
+        """, [self.env.uid] + [value for pair in zip(missing.ids, subscriptions.ids) for value in pair])
+        missing.invalidate_recordset(['subscription_id', 'write_uid', 'write_date'])
+        
+        return subscriptions
+
     def cancel_subscription(self):
         """Cancel Pub/Sub subscription for this space."""
         self.ensure_one()
         
         if self.subscription_id:
             # TODO: Delete subscription via Google Cloud Pub/Sub API
-            _logger.info(f"Cancelling subscription for space {self.space_id}")
+            _logger.info("Cancelling subscription for space %s", self.space_id)
             self.subscription_id.unlink()
 
     def sync_members(self):
         """
-        Sync space members with project followers.
+        Sync space members from Google Chat.
         
         Returns:
             dict: Sync result
         """
-        self.ensure_one()
-        
-        try:
-            # TODO: Implement member sync
-            # - Get space members from Google Chat API
-            # - Match with project followers
-            # - Create/update gchat.member records
-            _logger.info(f"Syncing members for space {self.space_id}")
-            
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': _('Success'),
-                    'message': _('Members synced successfully'),
-                    'type': 'success',
-                }
-            }
-            
-        except Exception as e:
-            raise UserError(_('Failed to sync members: %s') % str(e))
+        return self.env['gchat.member'].sync_space_members(self)
 
     def action_view_threads(self):
         """Open threads view for this space."""
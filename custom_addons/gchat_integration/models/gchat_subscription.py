@@ -1,11 +1,22 @@
 # -*- coding: utf-8 -*-
-from odoo import models, fields, api, _
+from odoo import models, fields, api, tools, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import groupby
 import logging
-from datetime import datetime, timedelta
+from collections import defaultdict
+from datetime import timedelta
 
 _logger = logging.getLogger(__name__)
 
+# Lifetime given to a subscription when it is created or renewed
+SUBSCRIPTION_LIFETIME = timedelta(days=7)
+# Active subscriptions expiring within this window are reported by the cron
+EXPIRY_WARNING_WINDOW = timedelta(days=1)
+# Expired subscriptions are kept this long before the cleanup cron deletes them
+EXPIRED_RETENTION = timedelta(days=7)
+# Statuses whose subscription name may be reused
+DEAD_STATUSES = ('expired', 'deleting')
+
 
 class GchatSubscription(models.Model):
     _name = 'gchat.subscription'
@@ -49,116 +60,214 @@ class GchatSubscription(models.Model):
     push_endpoint = fields.Char('Push Endpoint URL')
     push_attributes = fields.Text('Push Attributes (JSON)')
     
-    _sql_constraints = [
-        ('unique_subscription_name', 'unique(subscription_name)', 
-         'Subscription name must be unique.'),
-    ]
+    def _auto_init(self):
+        res = super()._auto_init()
+        # Subscription names must be unique among live subscriptions only, so
+        # a name can be reused once the previous one expired or is being deleted
+        self.env.cr.execute("ALTER TABLE gchat_subscription DROP CONSTRAINT IF EXISTS gchat_subscription_unique_subscription_name")
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS gchat_subscription_unique_subscription_name_live
+            ON gchat_subscription (subscription_name) WHERE status NOT IN ('expired', 'deleting')
+        """)
+        return res
+
+    def init(self):
+        # Serves both expiry crons (status = ... AND expires_at <= / < ...)
+        tools.create_index(self._cr, 'gchat_subscription_status_expires_idx',
+                           self._table, ['status', 'expires_at'])
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        # The partial unique index rejects duplicates at INSERT time, before
+        # constraints run; check first to raise the user-facing message
+        names = [
+            vals.get('subscription_name')
+            for vals in vals_list if vals.get('status', 'creating') not in DEAD_STATUSES
+        ]
+        if len(set(names)) < len(names) or self._live_name_exists(names):
+            raise ValidationError(_('Subscription name must be unique.'))
+        return super().create(vals_list)
+
+    @api.constrains('subscription_name', 'status')
+    def _check_unique_subscription_name(self):
+        """Ensure a name is used by one live subscription only."""
+        # Checked from the cache before the write is flushed, so the partial
+        # unique index never surfaces as a raw IntegrityError
+        live = self.filtered(lambda s: s.status not in DEAD_STATUSES)
+        names = live.mapped('subscription_name')
+        if len(set(names)) < len(names) or self._live_name_exists(names, live.ids):
+            raise ValidationError(_('Subscription name must be unique.'))
+
+    @api.model
+    def _live_name_exists(self, names, exclude_ids=None):
+        """
+        Check whether other live subscriptions already use some names.
+        
+        Args:
+            names (list): Subscription names
+            exclude_ids (list): Subscription ids to leave out, e.g. the ones being written
+            
+        Returns:
+            bool: True if one of the names is taken
+        """
+        if not names:
+            return False
+        self.env.cr.execute("""
+            SELECT 1 FROM gchat_subscription
+             WHERE subscription_name IN %s AND status NOT IN %s AND id NOT IN %s
+             LIMIT 1
+        """, [tuple(names), DEAD_STATUSES, tuple(exclude_ids or [0])])
+        return bool(self.env.cr.fetchone())
 
     @api.constrains('config_id', 'space_id')
     def _check_company_consistency(self):
         """Ensure config and space belong to same company."""
-        for subscription in self:
-            if subscription.space_id and subscription.config_id.company_id != subscription.space_id.project_id.company_id:
-                raise ValidationError(_('Configuration and space must belong to the same company.'))
+        # One query for the whole recordset; subscriptions without a space
+        # drop out of the inner join
+        self.flush_recordset(['config_id', 'space_id'])
+        self.env['gchat.config'].flush_model(['company_id'])
+        self.env['gchat.space'].flush_model(['project_id'])
+        self.env['project.project'].flush_model(['company_id'])
+        self.env.cr.execute("""
+            SELECT sub.id
+              FROM gchat_subscription sub
+              JOIN gchat_config c ON c.id = sub.config_id
+              JOIN gchat_space s ON s.id = sub.space_id
+              JOIN project_project p ON p.id = s.project_id
+             WHERE sub.id IN %s
+               AND c.company_id IS DISTINCT FROM p.company_id
+             LIMIT 1
+        """, [tuple(self.ids)])
+        if self.env.cr.fetchone():
+            raise ValidationError(_('Configuration and space must belong to the same company.'))
 
     def create_on_gcp(self):
         """
-        Create subscription on Google Cloud Pub/Sub.
+        Create subscriptions on Google Cloud Pub/Sub.
+        
+        Records are updated with one write per outcome (success, or each
+        distinct error) rather than one per subscription.
         
         Returns:
-            bool: True if successful
+            bool: True if all subscriptions were created
         """
-        self.ensure_one()
+        created = self.browse()
+        errors = defaultdict(list)
         
-        try:
-            # TODO: Implement Google Cloud Pub/Sub API call
-            # - Use config.get_client() to get authenticated client
-            # - Call Pub/Sub API to create subscription
-            # - Set push endpoint if mode is push
-            _logger.info(f"Creating subscription {self.subscription_name} on GCP")
-            
-            # Mock implementation
-            self.write({
+        for subscription in self:
+            try:
+                # TODO: Implement Google Cloud Pub/Sub API call
+                # - Use config_id.get_client() to get authenticated client
+                # - Call Pub/Sub API to create subscription
+                # - Set push endpoint if mode is push
+                _logger.info("Creating subscription %s on GCP", subscription.subscription_name)
+                
+                # Mock implementation
+                created |= subscription
+                
+            except Exception as e:
+                errors[str(e)].append(subscription.id)
+                _logger.error("Failed to create subscription: %s", e)
+        
+        if created:
+            created.write({
                 'status': 'active',
-                'expires_at': datetime.now() + timedelta(days=7),  # 7 days expiry
+                'expires_at': fields.Datetime.now() + SUBSCRIPTION_LIFETIME,
                 'error_message': False
             })
-            
-            return True
-            
-        except Exception as e:
-            self.write({
-                'status': 'error',
-                'error_message': str(e)
-            })
-            _logger.error(f"Failed to create subscription: {str(e)}")
-            return False
+        self._write_gcp_errors(errors)
+        
+        return not errors
 
     def renew_on_gcp(self):
         """
-        Renew subscription on Google Cloud Pub/Sub.
+        Renew subscriptions on Google Cloud Pub/Sub.
+        
+        Records are updated with one write per outcome (success, or each
+        distinct error) rather than one per subscription.
         
         Returns:
-            bool: True if successful
+            bool: True if all subscriptions were renewed
         """
-        self.ensure_one()
+        renewed = self.browse()
+        errors = defaultdict(list)
         
-        try:
+        # Grouped by configuration so the authenticated client is set up once
+        # per configuration; Pub/Sub has no batch update call
+        for config, subscriptions in groupby(self, key=lambda s: s.config_id):
             # TODO: Implement subscription renewal
-            # - Extend subscription expiry
-            # - Update push endpoint if needed
-            _logger.info(f"Renewing subscription {self.subscription_name}")
-            
-            # Mock implementation
-            self.write({
-                'expires_at': datetime.now() + timedelta(days=7),
+            # - Use config.get_client() to get authenticated client
+            for subscription in subscriptions:
+                try:
+                    # TODO: Extend subscription expiry
+                    # - Update push endpoint if needed
+                    _logger.info("Renewing subscription %s", subscription.subscription_name)
+                    
+                    # Mock implementation
+                    renewed |= subscription
+                    
+                except Exception as e:
+                    errors[str(e)].append(subscription.id)
+                    _logger.error("Failed to renew subscription: %s", e)
+        
+        if renewed:
+            renewed.write({
+                'expires_at': fields.Datetime.now() + SUBSCRIPTION_LIFETIME,
                 'status': 'active',
                 'error_message': False
             })
-            
-            return True
-            
-        except Exception as e:
-            self.write({
-                'status': 'error',
-                'error_message': str(e)
-            })
-            _logger.error(f"Failed to renew subscription: {str(e)}")
-            return False
+        self._write_gcp_errors(errors)
+        
+        return not errors
 
     def delete_on_gcp(self):
         """
-        Delete subscription on Google Cloud Pub/Sub.
+        Delete subscriptions on Google Cloud Pub/Sub.
+        
+        Records are updated with one write per outcome (success, or each
+        distinct error) rather than one per subscription.
         
         Returns:
-            bool: True if successful
+            bool: True if all subscriptions were deleted
         """
-        self.ensure_one()
+        deleted = self.browse()
+        errors = defaultdict(list)
         
-        try:
-            # TODO: Implement subscription deletion
-            # - Call Pub/Sub API to delete subscription
-            _logger.info(f"Deleting subscription {self.subscription_name} from GCP")
-            
-            # Mock implementation
-            self.write({'status': 'deleting'})
-            
-            return True
-            
-        except Exception as e:
-            self.write({
+        for subscription in self:
+            try:
+                # TODO: Implement subscription deletion
+                # - Use config_id.get_client() to get authenticated client
+                # - Call Pub/Sub API to delete subscription
+                _logger.info("Deleting subscription %s from GCP", subscription.subscription_name)
+                
+                # Mock implementation
+                deleted |= subscription
+                
+            except Exception as e:
+                errors[str(e)].append(subscription.id)
+                _logger.error("Failed to delete subscription: %s", e)
+        
+        if deleted:
+            deleted.write({'status': 'deleting'})
+        self._write_gcp_errors(errors)
+        
+        return not errors
+
+    def _write_gcp_errors(self, errors):
+        """Mark failed subscriptions, one write per distinct error message."""
+        for message, subscription_ids in errors.items():
+            self.browse(subscription_ids).write({
                 'status': 'error',
-                'error_message': str(e)
+                'error_message': message
             })
-            _logger.error(f"Failed to delete subscription: {str(e)}")
-            return False
 
-    def is_expiring(self, days_threshold=1):
+    def is_expiring(self, days_threshold=None):
         """
         Check if subscription is expiring soon.
         
         Args:
-            days_threshold (int): Days before expiry to consider as expiring
+            days_threshold (int): Days before expiry to consider as expiring,
+                defaults to EXPIRY_WARNING_WINDOW
             
         Returns:
             bool: True if expiring soon
@@ -166,8 +275,8 @@ class GchatSubscription(models.Model):
         if not self.expires_at:
             return False
             
-        threshold_date = datetime.now() + timedelta(days=days_threshold)
-        return self.expires_at <= threshold_date
+        window = EXPIRY_WARNING_WINDOW if days_threshold is None else timedelta(days=days_threshold)
+        return self.expires_at <= fields.Datetime.now() + window
 
     def action_create(self):
         """Action to create subscription on GCP."""
@@ -226,13 +335,18 @@ class GchatSubscription(models.Model):
         """
         Cron job to check for expiring subscriptions.
         """
-        expiring_subs = self.search([
-            ('status', '=', 'active'),
-            ('expires_at', '<=', datetime.now() + timedelta(days=1))
-        ])
+        # Only the names are logged: select them directly instead of
+        # loading full records (error_message, push_attributes, ...)
+        now = fields.Datetime.now()
+        self.flush_model(['status', 'expires_at', 'subscription_name'])
+        self.env.cr.execute("""
+            SELECT subscription_name FROM gchat_subscription
+             WHERE status = 'active' AND expires_at <= %s
+        """, [now + EXPIRY_WARNING_WINDOW])
+        names = [name for name, in self.env.cr.fetchall()]
         
-        for subscription in expiring_subs:
-            _logger.warning(f"Subscription {subscription.subscription_name} is expiring soon")
+        if names:
+            _logger.warning("%s subscription(s) expiring soon: %s", len(names), ', '.join(names))
             # TODO: Send notification to admin or auto-renew
 
     @api.model
@@ -240,11 +354,16 @@ class GchatSubscription(models.Model):
         """
         Cron job to cleanup expired subscriptions.
         """
-        expired_subs = self.search([
-            ('status', '=', 'expired'),
-            ('expires_at', '<', datetime.now() - timedelta(days=7))
-        ])
-        
-        for subscription in expired_subs:
-            _logger.info(f"Cleaning up expired subscription {subscription.subscription_name}")
-            subscription.unlink() 
\ No newline at end of file
+        now = fields.Datetime.now()
+        self.flush_model(['status', 'expires_at', 'subscription_name'])
+        self.env.cr.execute("""
+            SELECT id, subscription_name FROM gchat_subscription
+             WHERE status = 'expired' AND expires_at < %s
+        """, [now - EXPIRED_RETENTION])
+        rows = self.env.cr.fetchall()
+        
+        if rows:
+            _logger.info("Cleaning up %s expired subscription(s): %s",
+                         len(rows), ', '.join(name for _id, name in rows))
+            # One DELETE ... WHERE id IN (...) instead of one per subscription
+            self.browse([sub_id for sub_id, _name in rows]).unlink() 
\ No newline at end of file
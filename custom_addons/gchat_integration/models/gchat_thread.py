@@ -1,10 +1,29 @@
 # -*- coding: utf-8 -*-
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError, ValidationError
+from odoo.tools import groupby
 import logging
+from collections import defaultdict
 
 _logger = logging.getLogger(__name__)
 
+# Task fields reported in Chat update messages, with their labels
+FIELD_LABELS = {
+    'name': 'Name',
+    'user_id': 'Assignee',
+    'stage_id': 'Stage',
+    'priority': 'Priority',
+    'date_deadline': 'Deadline',
+    'description': 'Description',
+    'tag_ids': 'Tags'
+}
+
+# Task priority values as shown in Chat messages
+PRIORITY_LABELS = {'0': 'Low', '1': 'Normal', '2': 'High'}
+
+# Many2one task fields whose record name is shown in Chat messages
+CHANGE_NAME_MODELS = {'user_id': 'res.users', 'stage_id': 'project.task.type'}
+
 
 class GchatThread(models.Model):
     _name = 'gchat.thread'
@@ -12,7 +31,7 @@ class GchatThread(models.Model):
     _rec_name = 'display_name'
 
     task_id = fields.Many2one('project.task', string='Task', required=True, ondelete='cascade')
-    space_id = fields.Many2one('gchat.space', string='Space', required=True, ondelete='cascade')
+    space_id = fields.Many2one('gchat.space', string='Space', required=True, ondelete='cascade', index=True)
     
     thread_key = fields.Char('Thread Key', required=True, 
                             help='Google Chat thread identifier')
@@ -35,6 +54,9 @@ class GchatThread(models.Model):
     # Message count
     message_count = fields.Integer('Message Count', default=0)
     
+    # Task changes waiting to be pushed by the background cron
+    pending_changes = fields.Json('Pending Changes', copy=False)
+    
     _sql_constraints = [
         ('unique_task_thread', 'unique(task_id)', 
          'Only one Google Chat thread per task is allowed.'),
@@ -77,13 +99,13 @@ class GchatThread(models.Model):
             # - Use space.config_id.get_client() to get authenticated client
             # - Call Chat API to create/verify thread
             # - Update thread metadata
-            _logger.info(f"Ensuring thread exists for task {self.task_id.name}")
+            _logger.info("Ensuring thread exists for task %s", self.task_id.name)
             
             # Mock implementation - thread is created when first message is sent
             return True
             
         except Exception as e:
-            _logger.error(f"Failed to ensure thread: {str(e)}")
+            _logger.error("Failed to ensure thread: %s", e)
             return False
 
     def push_task_update(self, vals_changed):
@@ -122,9 +144,128 @@ class GchatThread(models.Model):
             return response
             
         except Exception as e:
-            _logger.error(f"Failed to push task update: {str(e)}")
+            _logger.error("Failed to push task update: %s", e)
             raise UserError(_('Failed to send message to Google Chat: %s') % str(e))
 
+    def push_task_updates_batch(self, changes_by_thread):
+        """
+        Push task updates to several threads at once.
+        
+        Messages are sent with one Chat batch request per configuration
+        instead of one HTTP round-trip per thread. Failures are reported per
+        thread instead of raised, so threads already sent are never lost
+        because a later thread or configuration failed.
+        
+        Args:
+            changes_by_thread (dict): {gchat.thread record: changed field values}
+            
+        Returns:
+            dict: {gchat.thread record: API response}, with 'success' False
+                and an 'error' for threads that could not be sent
+        """
+        threads = self.concat(*changes_by_thread)
+        if len(threads) == 1:
+            try:
+                response = threads.push_task_update(changes_by_thread[threads])
+            except UserError as e:
+                response = {'success': False, 'error': str(e)}
+            return {threads: response}
+        
+        results = {}
+        ready = self.browse()
+        for thread in threads:
+            if thread.ensure_thread():
+                ready |= thread
+            else:
+                results[thread] = {'success': False, 'error': _('Failed to ensure thread exists')}
+        
+        self._prefetch_change_names(changes_by_thread.values())
+        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+        
+        for config, config_threads in groupby(ready, key=lambda t: t.space_id.config_id):
+            messages = [
+                (thread.space_id.space_id,
+                 {'text': thread._format_task_update_message(changes_by_thread[thread], base_url)},
+                 thread.thread_key)
+                for thread in config_threads
+            ]
+            try:
+                responses = config.send_chat_batch(messages)
+            except Exception as e:
+                # e.g. the token of this config cannot be refreshed; the
+                # other configs are still sent
+                _logger.error("Failed to push %s task update(s) for config %s: %s", len(messages), config.id, e)
+                responses = [{'success': False, 'error': str(e)}] * len(messages)
+            
+            # Update last message info
+            now = fields.Datetime.now()
+            for thread, response in zip(config_threads, responses):
+                results[thread] = response
+                if response.get('success'):
+                    thread.write({
+                        'last_message_id': response.get('message_id'),
+                        'message_count': thread.message_count + 1,
+                        'last_event_ts': now
+                    })
+        
+        return results
+
+    def queue_task_update(self, vals_changed):
+        """
+        Queue a task update to be pushed to Google Chat in the background.
+        
+        Changes are merged into each thread's pending changes and the push
+        cron is triggered, so the caller's transaction never waits on the
+        Chat API or fails because of it.
+        
+        Args:
+            vals_changed (dict): Changed field values
+        """
+        self.queue_task_updates({thread: vals_changed for thread in self})
+
+    @api.model
+    def queue_task_updates(self, changes_by_thread):
+        """
+        Queue different task updates for several threads, with one cron trigger.
+        
+        Args:
+            changes_by_thread (dict): {gchat.thread record: changed field values}
+        """
+        for thread, vals_changed in changes_by_thread.items():
+            # jsonb only holds JSON types; dates and the like are queued as text
+            changes = {
+                field: value if isinstance(value, (str, int, float, bool, type(None))) else str(value)
+                for field, value in vals_changed.items()
+            }
+            thread.pending_changes = dict(thread.pending_changes or {}, **changes)
+        if changes_by_thread:
+            self.env.ref('gchat_integration.ir_cron_push_task_updates')._trigger()
+
+    @api.model
+    def _cron_push_task_updates(self):
+        """
+        Cron job to push queued task updates to Google Chat.
+        
+        Threads whose push failed keep their pending changes and are
+        retried on the next run.
+        """
+        self.flush_model(['pending_changes'])
+        self.env.cr.execute("SELECT id FROM gchat_thread WHERE pending_changes IS NOT NULL AND active")
+        threads = self.browse([thread_id for thread_id, in self.env.cr.fetchall()])
+        if not threads:
+            return
+        
+        # Failures come back per thread, so whatever was sent is always
+        # dequeued and never pushed twice
+        results = self.push_task_updates_batch({thread: thread.pending_changes for thread in threads})
+        
+        sent = self.concat(*[thread for thread, response in results.items() if response.get('success')])
+        sent.write({'pending_changes': False})
+        if len(sent) < len(threads):
+            _logger.error("Failed to push %s of %s queued task update(s); they will be retried",
+                          len(threads) - len(sent), len(threads))
+        _logger.info("Pushed %s of %s queued task update(s)", len(sent), len(threads))
+
     def push_attachment(self, attachment):
         """
         Push attachment to Google Chat thread.
@@ -144,21 +285,22 @@ class GchatThread(models.Model):
             # TODO: Implement attachment upload
             # - Upload file to Google Drive or similar
             # - Create message with attachment card
-            _logger.info(f"Pushing attachment {attachment.name} to thread {self.thread_key}")
+            _logger.info("Pushing attachment %s to thread %s", attachment.name, self.thread_key)
             
             # Mock implementation
             return {'success': True, 'message_id': 'mock_attachment_123'}
             
         except Exception as e:
-            _logger.error(f"Failed to push attachment: {str(e)}")
+            _logger.error("Failed to push attachment: %s", e)
             raise UserError(_('Failed to send attachment to Google Chat: %s') % str(e))
 
-    def _format_task_update_message(self, vals_changed):
+    def _format_task_update_message(self, vals_changed, base_url=None):
         """
         Format task update message for Google Chat.
         
         Args:
             vals_changed (dict): Changed field values
+            base_url (str): web.base.url, when already fetched by the caller
             
         Returns:
             str: Formatted message text
@@ -167,43 +309,50 @@ class GchatThread(models.Model):
         changes = []
         
         # Map field changes to readable messages
-        field_mapping = {
-            'name': 'Name',
-            'user_id': 'Assignee',
-            'stage_id': 'Stage',
-            'priority': 'Priority',
-            'date_deadline': 'Deadline',
-            'description': 'Description',
-            'tag_ids': 'Tags'
-        }
-        
         for field, value in vals_changed.items():
-            if field in field_mapping:
+            label = FIELD_LABELS.get(field)
+            if label:
                 if field == 'user_id':
                     user = self.env['res.users'].browse(value)
-                    changes.append(f"*{field_mapping[field]}*: {user.name}")
+                    changes.append(f"*{label}*: {user.name}")
                 elif field == 'stage_id':
                     stage = self.env['project.task.type'].browse(value)
-                    changes.append(f"*{field_mapping[field]}*: {stage.name}")
+                    changes.append(f"*{label}*: {stage.name}")
                 elif field == 'priority':
-                    priority_labels = {'0': 'Low', '1': 'Normal', '2': 'High'}
-                    changes.append(f"*{field_mapping[field]}*: {priority_labels.get(str(value), value)}")
-                elif field == 'date_deadline':
-                    changes.append(f"*{field_mapping[field]}*: {value}")
+                    changes.append(f"*{label}*: {PRIORITY_LABELS.get(str(value), value)}")
                 else:
-                    changes.append(f"*{field_mapping[field]}*: {value}")
+                    changes.append(f"*{label}*: {value}")
         
+        # Header, blank line, changes (if any) and a blank line, then the link
+        parts = [f"📋 *Task Updated: {task.name}*", ""]
         if changes:
-            message = f"📋 *Task Updated: {task.name}*\n\n"
-            message += "\n".join(changes)
-            message += f"\n\n🔗 [View in Odoo]({self._get_task_url()})"
-            return message
-        else:
-            return f"📋 *Task Updated: {task.name}*\n\n🔗 [View in Odoo]({self._get_task_url()})"
-
-    def _get_task_url(self):
-        """Get Odoo URL for the task."""
-        base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
+            parts.extend(changes)
+            parts.append("")
+        parts.append(f"🔗 [View in Odoo]({self._get_task_url(base_url)})")
+        return "\n".join(parts)
+
+    def _prefetch_change_names(self, changes_list):
+        """
+        Load the user/stage names referenced by task changes, one read per model.
+        
+        _format_task_update_message then finds them in the cache instead of
+        issuing one query per formatted message.
+        
+        Args:
+            changes_list (iterable): Changed field values dicts
+        """
+        ids_by_model = defaultdict(set)
+        for vals_changed in changes_list:
+            for field, model in CHANGE_NAME_MODELS.items():
+                if vals_changed.get(field):
+                    ids_by_model[model].add(vals_changed[field])
+        for model, ids in ids_by_model.items():
+            self.env[model].browse(list(ids)).read(['name'])
+
+    def _get_task_url(self, base_url=None):
+        """Get Odoo URL for the task (base_url is looked up when not given)."""
+        if base_url is None:
+            base_url = self.env['ir.config_parameter'].sudo().get_param('web.base.url')
         return f"{base_url}/web#id={self.task_id.id}&model=project.task&view_type=form"
 
     def action_view_messages(self):
@@ -213,7 +362,7 @@ class GchatThread(models.Model):
         # TODO: Implement messages view
         # - Show recent messages from Google Chat
         # - Allow sending new messages
-        _logger.info(f"Opening messages view for thread {self.thread_key}")
+        _logger.info("Opening messages view for thread %s", self.thread_key)
         pass
 
     @api.model
@@ -227,21 +376,39 @@ class GchatThread(models.Model):
         Returns:
             gchat.thread: Created thread record
         """
-        # Find space for the task's project
-        space = self.env['gchat.space'].search([
-            ('project_id', '=', task.project_id.id),
-            ('active', '=', True)
-        ], limit=1)
-        
-        if not space:
+        thread = self.create_threads_for_tasks(task)
+        if not thread:
             raise UserError(_('No Google Chat space configured for project %s') % task.project_id.name)
         
-        # Create thread record
-        thread = self.create({
+        return thread
+
+    @api.model
+    def create_threads_for_tasks(self, tasks):
+        """
+        Create thread records for several tasks.
+        
+        The spaces of all projects are found with one search and the threads
+        are inserted with one multi-create. Tasks whose project has no active
+        space are skipped.
+        
+        Args:
+            tasks: project.task recordset
+            
+        Returns:
+            gchat.thread: Created thread records
+        """
+        # Find spaces for the tasks' projects
+        spaces_by_project = {}
+        for space in self.env['gchat.space'].search([
+            ('project_id', 'in', tasks.mapped('project_id').ids),
+            ('active', '=', True)
+        ]):
+            spaces_by_project.setdefault(space.project_id.id, space)
+        
+        # Create thread records
+        return self.create([{
             'task_id': task.id,
-            'space_id': space.id,
+            'space_id': spaces_by_project[task.project_id.id].id,
             'thread_key': str(task.id),
             'thread_name': task.name
-        })
-        
-        return thread 
\ No newline at end of file
+        } for task in tasks if task.project_id.id in spaces_by_project])
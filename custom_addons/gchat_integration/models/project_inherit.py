@@ -2,9 +2,33 @@
 from odoo import models, fields, api, _
 from odoo.exceptions import UserError
 import logging
+import re
+import unicodedata
 
 _logger = logging.getLogger(__name__)
 
+# Runs of characters not allowed in a space id slug
+_SLUG_RE = re.compile(r'[^a-z0-9]+')
+
+
+def _slugify(name):
+    """
+    Build an ASCII space id slug from a project name.
+    
+    Accented letters are transliterated (e.g. "Dự án Đà Nẵng" gives
+    "du_an_da_nang") instead of being dropped.
+    
+    Args:
+        name (str): Project name
+        
+    Returns:
+        str: Slug, empty when the name has no usable character
+    """
+    # đ has no NFKD decomposition, map it by hand
+    normalized = unicodedata.normalize('NFKD', name.lower().replace('đ', 'd'))
+    ascii_name = ''.join(char for char in normalized if not unicodedata.combining(char))
+    return _SLUG_RE.sub('_', ascii_name).strip('_')
+
 
 class ProjectProject(models.Model):
     _inherit = 'project.project'
@@ -20,15 +44,17 @@ class ProjectProject(models.Model):
     @api.depends('gchat_sync_enabled')
     def _compute_gchat_space(self):
         """Compute the associated Google Chat space."""
+        # One search for all synced projects instead of one per project
+        synced = self.filtered('gchat_sync_enabled')
+        spaces_by_project = {}
+        if synced.ids:
+            for space in self.env['gchat.space'].search([
+                ('project_id', 'in', synced.ids),
+                ('active', '=', True)
+            ]):
+                spaces_by_project.setdefault(space.project_id.id, space)
         for project in self:
-            if project.gchat_sync_enabled:
-                space = self.env['gchat.space'].search([
-                    ('project_id', '=', project.id),
-                    ('active', '=', True)
-                ], limit=1)
-                project.gchat_space_id = space
-            else:
-                project.gchat_space_id = False
+            project.gchat_space_id = spaces_by_project.get(project.id, False)
 
     @api.depends('gchat_space_id')
     def _compute_has_gchat_space(self):
@@ -39,11 +65,24 @@ class ProjectProject(models.Model):
     @api.depends('gchat_space_id.space_display_name', 'gchat_space_id.space_id')
     def _compute_gchat_space_name(self):
         """Compute the display name of the Google Chat space."""
+        # One read of the two name columns for all spaces, instead of
+        # prefetching every gchat.space field
+        names = {
+            row['id']: row['space_display_name'] or row['space_id']
+            for row in self.mapped('gchat_space_id').read(['space_display_name', 'space_id'])
+        }
         for project in self:
-            if project.gchat_space_id:
-                project.gchat_space_name = project.gchat_space_id.space_display_name or project.gchat_space_id.space_id
-            else:
-                project.gchat_space_name = ''
+            project.gchat_space_name = names.get(project.gchat_space_id.id, '')
+
+    def _get_active_gchat_config(self):
+        """
+        Get the active Google Chat configuration of the project's company.
+        
+        Returns:
+            gchat.config: Active configuration, or an empty recordset
+        """
+        # Backed by gchat.config's ormcache, so repeated actions do not search again
+        return self.env['gchat.config']._get_for_company(self.company_id.id)
 
     def action_sync_with_gchat(self):
         """
@@ -55,10 +94,7 @@ class ProjectProject(models.Model):
         self.ensure_one()
         
         # Check if configuration exists
-        config = self.env['gchat.config'].search([
-            ('company_id', '=', self.company_id.id),
-            ('is_active', '=', True)
-        ], limit=1)
+        config = self._get_active_gchat_config()
         
         if not config:
             raise UserError(_('No active Google Chat configuration found for your company. Please configure Google Chat integration first.'))
@@ -107,19 +143,17 @@ class ProjectProject(models.Model):
         
         try:
             # Find configuration
-            config = self.env['gchat.config'].search([
-                ('company_id', '=', self.company_id.id),
-                ('is_active', '=', True)
-            ], limit=1)
+            config = self._get_active_gchat_config()
             
             if not config:
                 raise UserError(_('No active Google Chat configuration found.'))
             
             # Create space record
+            slug = _slugify(self.name)
             space = self.env['gchat.space'].create({
                 'project_id': self.id,
                 'config_id': config.id,
-                'space_id': f"spaces/{self.id}_{self.name.lower().replace(' ', '_')}",
+                'space_id': f"spaces/{self.id}_{slug}" if slug else f"spaces/project_{self.id}",
                 'space_display_name': self.name,
                 'space_type': 'ROOM',
                 'active': True
@@ -158,10 +192,7 @@ class ProjectProject(models.Model):
         
         try:
             # Find configuration
-            config = self.env['gchat.config'].search([
-                ('company_id', '=', self.company_id.id),
-                ('is_active', '=', True)
-            ], limit=1)
+            config = self._get_active_gchat_config()
             
             if not config:
                 raise UserError(_('No active Google Chat configuration found.'))
@@ -19,19 +19,22 @@ class ProjectTask(models.Model):
     @api.depends('project_id.gchat_sync_enabled')
     def _compute_gchat_thread(self):
         """Compute the associated Google Chat thread."""
+        # One search for all synced tasks instead of one per task
+        synced = self.filtered(lambda t: t.project_id.gchat_sync_enabled)
+        threads_by_task = {}
+        if synced.ids:
+            for thread in self.env['gchat.thread'].search([
+                ('task_id', 'in', synced.ids),
+                ('active', '=', True)
+            ]):
+                threads_by_task.setdefault(thread.task_id.id, thread)
         for task in self:
-            if task.project_id.gchat_sync_enabled:
-                thread = self.env['gchat.thread'].search([
-                    ('task_id', '=', task.id),
-                    ('active', '=', True)
-                ], limit=1)
-                task.gchat_thread_id = thread
-            else:
-                task.gchat_thread_id = False
+            task.gchat_thread_id = threads_by_task.get(task.id, False)
 
     @api.depends('gchat_thread_id')
     def _compute_has_gchat_thread(self):
         """Compute if task has a Google Chat thread."""
+        # Truth value of the many2one only needs its id; no thread row is read
         for task in self:
             task.has_gchat_thread = bool(task.gchat_thread_id)
 
@@ -39,27 +42,30 @@ class ProjectTask(models.Model):
     def _compute_gchat_thread_key(self):
         """Compute the thread key."""
         for task in self:
-            task.gchat_thread_key = task.gchat_thread_id.thread_key if task.gchat_thread_id else ''
+            # Fetch only thread_key, still in one query for all threads
+            task.gchat_thread_key = task.gchat_thread_id.with_context(prefetch_fields=False).thread_key or ''
 
-    @api.model
-    def create(self, vals):
+    @api.model_create_multi
+    def create(self, vals_list):
         """Override create to handle Google Chat integration."""
-        task = super().create(vals)
+        tasks = super().create(vals_list)
         
-        # Create Google Chat thread if project has sync enabled
-        if task.project_id.gchat_sync_enabled:
+        # Create Google Chat threads for tasks whose project has sync enabled,
+        # all in one batch
+        sync_tasks = tasks.filtered(lambda t: t.project_id.gchat_sync_enabled)
+        if sync_tasks:
             try:
-                thread = self.env['gchat.thread'].create_thread_for_task(task)
-                _logger.info(f"Created Google Chat thread for task {task.name}")
+                threads = self.env['gchat.thread'].create_threads_for_tasks(sync_tasks)
+                _logger.info("Created %s Google Chat thread(s) for %s task(s)", len(threads), len(sync_tasks))
                 
-                # Send initial message to thread
-                if thread:
-                    thread.push_task_update({'name': task.name})
+                # Initial messages are sent in the background
+                threads = threads.sudo()
+                threads.queue_task_updates({thread: {'name': thread.task_id.name} for thread in threads})
                     
             except Exception as e:
-                _logger.error(f"Failed to create Google Chat thread for task {task.name}: {str(e)}")
+                _logger.error("Failed to create Google Chat threads for %s task(s): %s", len(sync_tasks), e)
         
-        return task
+        return tasks
 
     def write(self, vals):
         """Override write to handle Google Chat integration."""
@@ -71,33 +77,64 @@ class ProjectTask(models.Model):
             if field in vals:
                 changes_to_notify[field] = vals[field]
         
+        # Snapshot the old values so no-op writes (same value saved again)
+        # do not queue a notification
+        old_values = {
+            field: {task.id: task._gchat_field_value(field) for task in self}
+            for field in changes_to_notify
+        }
+        
         result = super().write(vals)
         
-        # Send notification to Google Chat if there are important changes
-        if changes_to_notify and self.gchat_thread_id:
+        # Keep, per task, only the fields whose value really changed on that
+        # task; the cron sends all queued threads in one batch per config,
+        # outside this transaction
+        changes_by_thread = {}
+        for task in (self.filtered('gchat_thread_id') if changes_to_notify else ()):
+            task_changes = {
+                field: value for field, value in changes_to_notify.items()
+                if old_values[field][task.id] != task._gchat_field_value(field)
+            }
+            if task_changes:
+                thread = task.gchat_thread_id.sudo()
+                changes_by_thread[thread] = dict(changes_by_thread.get(thread, {}), **task_changes)
+        
+        if changes_by_thread:
             try:
-                self.gchat_thread_id.push_task_update(changes_to_notify)
-                _logger.info(f"Sent Google Chat notification for task {self.name}")
+                self.env['gchat.thread'].sudo().queue_task_updates(changes_by_thread)
             except Exception as e:
-                _logger.error(f"Failed to send Google Chat notification for task {self.name}: {str(e)}")
+                _logger.error("Failed to queue Google Chat notification for %s task(s): %s", len(changes_by_thread), e)
         
         # Send DM notification when stage changes
-        if 'stage_id' in vals and self.user_id and self.user_id.email:
-            try:
-                self._send_stage_change_dm(vals['stage_id'])
-            except Exception as e:
-                _logger.error(f"Failed to send stage change DM for task {self.name}: {str(e)}")
+        if 'stage_id' in vals:
+            for task in self.filtered(lambda t: t.user_id.email):
+                try:
+                    task._send_stage_change_dm(vals['stage_id'])
+                except Exception as e:
+                    _logger.error("Failed to send stage change DM for task %s: %s", task.name, e)
         
         return result
 
+    def _gchat_field_value(self, field):
+        """
+        Return a comparable value of a field, many2one fields by id.
+        
+        Args:
+            field (str): Field name
+            
+        Returns:
+            Value of the field on this task
+        """
+        value = self[field]
+        if self._fields[field].type == 'many2one':
+            return value.id
+        return value
+
     def _send_stage_change_dm(self, new_stage_id):
         """Send DM notification when task stage changes."""
         try:
             # Get configuration
-            config = self.env['gchat.config'].search([
-                ('company_id', '=', self.company_id.id),
-                ('is_active', '=', True)
-            ], limit=1)
+            config = self.env['gchat.config']._get_for_company(self.company_id.id)
             
             if not config:
                 return
@@ -132,10 +169,10 @@ class ProjectTask(models.Model):
                 thread_key=str(self.id)
             )
             
-            _logger.info(f"Stage change DM sent to {self.user_id.email} for task {self.name}")
+            _logger.info("Stage change DM sent to %s for task %s", self.user_id.email, self.name)
             
         except Exception as e:
-            _logger.error(f"Failed to send stage change DM: {str(e)}")
+            _logger.error("Failed to send stage change DM: %s", e)
             raise
 
     def action_view_gchat_thread(self):
@@ -35,10 +35,7 @@ class GchatDmWizard(models.TransientModel):
         res = super().default_get(fields_list)
         
         # Get default config for current company
-        config = self.env['gchat.config'].search([
-            ('company_id', '=', self.env.company.id),
-            ('is_active', '=', True)
-        ], limit=1)
+        config = self.env['gchat.config']._get_for_company(self.env.company.id)
         
         if config:
             res['config_id'] = config.id
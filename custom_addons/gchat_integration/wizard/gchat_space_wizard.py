@@ -30,10 +30,7 @@ class GchatSpaceCreateWizard(models.TransientModel):
         
         try:
             # Find configuration
-            config = self.env['gchat.config'].search([
-                ('company_id', '=', self.project_id.company_id.id),
-                ('is_active', '=', True)
-            ], limit=1)
+            config = self.env['gchat.config']._get_for_company(self.project_id.company_id.id)
             
             if not config:
                 raise UserError(_('No active Google Chat configuration found.'))
@@ -101,10 +98,7 @@ class GchatSpaceLinkWizard(models.TransientModel):
     def _get_available_spaces(self):
         """Get list of available Google Chat spaces."""
         try:
-            config = self.env['gchat.config'].search([
-                ('company_id', '=', self.project_id.company_id.id),
-                ('is_active', '=', True)
-            ], limit=1)
+            config = self.env['gchat.config']._get_for_company(self.project_id.company_id.id)
             
             if not config:
                 return "No active Google Chat configuration found."
@@ -146,10 +140,7 @@ class GchatSpaceLinkWizard(models.TransientModel):
         
         try:
             # Find configuration
-            config = self.env['gchat.config'].search([
-                ('company_id', '=', self.project_id.company_id.id),
-                ('is_active', '=', True)
-            ], limit=1)
+            config = self.env['gchat.config']._get_for_company(self.project_id.company_id.id)
             
             if not config:
                 raise UserError(_('No active Google Chat configuration found.'))